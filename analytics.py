@@ -0,0 +1,241 @@
+from engine import StatsEngine, columns
+from metrics import timed
+from model import CATEGORIES, Games
+from ratings import Ratings
+
+# players sorted by score, as the pages expect
+def sort_players(data):
+    for game in data["Games"]:
+        game["Players"] = sorted(game["Players"], key=lambda player: player["Score"], reverse=True)
+    return data
+
+# calculate leaderboard statistics: player_stats, player_comps, delta_stats, delta_comps
+@timed()
+def calculate_stats(data):
+    return StatsEngine(data["Games"]).results()
+
+# current ratings and each player's rating after every game, without the rest of the stats
+@timed()
+def calculate_ratings(data):
+    games = data["Games"] if isinstance(data["Games"], Games) else Games(data["Games"])
+    result = Ratings.recompute(columns(games.records))
+    ids = {name: pid for name, pid in games.players.ids.items() if pid in result.ratings}
+    ratings = {name: round(result.ratings[pid]) for name, pid in ids.items()}
+    history = {name: [round(rating) for rating in result.history[pid]] for name, pid in ids.items()}
+    return ratings, history
+
+# leaderboard table sorted by rating, or by wins when there are no ratings
+@timed()
+def leaderboard(stats, ratings=None):
+    import pandas as pd
+    df = pd.DataFrame(stats).T
+    if not ratings:
+        return df.sort_values(by="Wins", ascending=False)
+    df.insert(0, "Rating", pd.Series(ratings))
+    return df.sort_values(by="Rating", ascending=False)
+
+# leaderboard over one run of games, with changes against another run when given
+@timed()
+def range_leaderboard(stats, base=None):
+    import pandas as pd
+    df = pd.DataFrame.from_dict(stats, orient="index")
+    df.insert(1, "Win Rate", (100 * df["Wins"] / df["Games"]).round(2))
+    if base:
+        old = pd.DataFrame.from_dict(base, orient="index").reindex(df.index)
+        df["Win Rate Change"] = (df["Win Rate"] - 100 * old["Wins"] / old["Games"]).round(2)
+        for column in ("Average Points", "Average Delta"):
+            df[column + " Change"] = (df[column] - old[column]).round(2)
+    return df.sort_values(by="Wins", ascending=False)
+
+# one game's players with the breakdown flattened into columns
+def game_frame(players):
+    import pandas as pd
+    df = pd.DataFrame(players)
+    breakdown_df = df["Breakdown"].apply(pd.Series)
+    return pd.concat([df.drop(columns=["Breakdown"]), breakdown_df], axis=1)
+
+# get match history
+@timed()
+def get_history(data):
+    scores = {}
+    places = {}
+
+    # loop
+    for game in data["Games"]:
+        # vars
+        winscore = 0
+        place = 1
+
+        # loop
+        for player in game["Players"]:
+            if player["Name"] not in scores: 
+                scores[player["Name"]] = [player["Score"]]
+                places[player["Name"]] = []
+
+            else: scores[player["Name"]].append(player["Score"])
+
+            # winner
+            if not winscore:
+                winscore = player["Score"]
+                places[player["Name"]].append(place)
+            
+            # tie for win
+            elif player["Score"] == winscore: places[player["Name"]].append(place)
+            
+            # else
+            else:
+                place += 1
+                places[player["Name"]].append(place)
+                
+
+    return scores, places
+
+# get synergy
+def find_synergy(comp):
+    categories = ["Wonders", "Gold", "War", "Blue", "Yellow", "Green", "Purple"]
+
+    # find the category with the highest point value
+    highest_category = max(categories, key=lambda category: comp[category])
+    return highest_category
+
+# analyzes comp data for best comp
+def read_comps(comps):
+    # vars
+    max_wins = 0
+    avg_pts = 0
+    best = "?"
+    
+    # loop
+    for comp in comps:
+        if comp == "?": continue
+        if comps[comp]["Wins"] > max_wins:
+            best = comp
+            avg_pts = round(float(comps[comp]["Points"])/comps[comp]["Games"], 2)
+
+        elif comps[comp]["Wins"] == max_wins:
+            temp = round(float(comps[comp]["Points"])/comps[comp]["Games"], 2)
+            if temp > avg_pts:
+                best = comp
+                avg_pts = temp
+            
+    return best
+
+# return distribution of synergy points
+def get_distribution(name, comps):
+    distribution = {"Wonders":0,"Gold":0,"War":0,"Blue":0,"Yellow":0,"Green":0,"Purple":0}
+    points = 0
+    for i, comp in enumerate(comps[name]):
+        points += comps[name][comp]["Points"]
+        for key in distribution:
+            distribution[key] += comps[name][comp][key]
+            if i == len(comps[name]) - 1:
+                distribution[key] = round(100 * float(distribution[key])/points)
+
+    return distribution
+
+# consolidates comp data and calculates average delta
+@timed()
+def process_comps(comps):
+    maps = {}
+    for player in comps:
+        for comp in comps[player]:
+            if comp not in maps:
+                maps[comp] = {"Wins":0,"Games":0,"Points":0,"Total Delta":0,"Wonders":0,"Gold":0,
+                                "War":0,"Blue":0,"Yellow":0,"Green":0,"Purple":0}
+            for feature in comps[player][comp]:
+                maps[comp][feature] += comps[player][comp][feature]
+    
+    for comp in maps:
+        maps[comp]["Average Delta"] = round(maps[comp]["Total Delta"]/maps[comp]["Games"], 2)
+
+    return maps
+
+
+# overview metrics for one player as (value, delta since the last game) pairs
+def player_overview(name, stats, comps, delta_stats, delta_comps):
+    player = stats[name]
+    old = delta_stats.get(name)
+    overview = {}
+
+    # wins, win rate, avg points and delta
+    win_rate = round(100 * player["Wins"] / player["Games"], 2)
+    if old:
+        overview["Wins"] = (player["Wins"], player["Wins"] - old["Wins"])
+        overview["Win Rate"] = (win_rate, round(win_rate - round(100 * old["Wins"] / old["Games"], 2), 2))
+        overview["Average Points"] = (player["Average Points"], round(player["Average Points"] - old["Average Points"], 2))
+        overview["Average Delta"] = (player["Average Delta"], round(player["Average Delta"] - old["Average Delta"], 2))
+    else:
+        overview["Wins"] = (player["Wins"], None)
+        overview["Win Rate"] = (win_rate, None)
+        overview["Average Points"] = (player["Average Points"], None)
+        overview["Average Delta"] = (player["Average Delta"], None)
+
+    # best comp and its synergy
+    best = read_comps(comps[name])
+    syn = find_synergy(comps[name][best])
+    comp = comps[name][best]
+    games = comp["Games"]
+    overview["Most Successful Comp"] = best
+    overview["Synergy"] = syn
+    overview["Comp Win Rate"] = round(100 * float(comp["Wins"])/games, 2)
+    overview["Comp Average Points"] = round(float(comp["Points"])/games, 2)
+    overview["Comp Average Delta"] = round(float(comp["Total Delta"])/games, 2)
+    overview["Comp Synergy Points"] = round(float(comp[syn])/games, 2)
+
+    # synergy distribution
+    distribution = get_distribution(name, comps)
+    delta_distribution = get_distribution(name, delta_comps) if name in delta_comps else distribution
+    overview["Distribution"] = {category: (distribution[category], round(delta_distribution[category] - distribution[category], 1))
+                                for category in CATEGORIES}
+
+    return overview
+
+# lowest and highest average delta over all comps except "?"
+def get_tier_params(maps):
+    tiers = []
+    for comp in maps:
+        if comp != "?":
+            tiers.append((comp, maps[comp]["Average Delta"]))
+
+    low = min(tiers, key=lambda x: x[1])
+    high = max(tiers, key=lambda x: x[1])
+
+    return low[1], high[1]
+
+def tier_function(low, high, value):
+    normalized = 100* (value + abs(low)) / (high + abs(low))
+    if normalized > 80: return "S", normalized
+    elif normalized > 50: return "A", normalized
+    else: return "B", normalized
+
+# per mode tier, power and metrics with deltas against the previous game
+@timed()
+def tier_table(maps, delta_maps):
+    table = {}
+    # nothing to rank, e.g. only "?" games so far
+    if not any(mode != "?" for mode in maps):
+        return table
+    low, high = get_tier_params(maps)
+    for mode in maps:
+        comp = maps[mode]
+        games = comp["Games"]
+        old = delta_maps.get(mode)
+        tier, power = tier_function(low, high, comp["Average Delta"])
+
+        # deltas divide by the current game count, as the page always has
+        win_rate = round(100 * float(comp["Wins"])/games, 2)
+        average_points = round(float(comp["Points"])/games, 2)
+        average_delta = comp["Average Delta"]
+        table[mode] = {
+            "Tier": tier,
+            "Power": power,
+            "Win Rate": win_rate,
+            "Win Rate Delta": round(win_rate - (100 * float(old["Wins"])/games), 2) if old else None,
+            "Average Points": average_points,
+            "Average Points Delta": round(average_points - float(old["Points"])/games, 2) if old else None,
+            "Average Delta": average_delta,
+            "Average Delta Delta": round(average_delta - old["Average Delta"], 2) if old else None,
+            "Points": comp["Points"],
+            **{category: comp[category] for category in CATEGORIES}}
+
+    return table
@@ -2,368 +2,490 @@ import streamlit as st
 import pandas as pd
 import altair as alt
 import json
-import time
 import webbrowser
 import os.path
-
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-
-from google.oauth2 import service_account
-
-# dec index
+import bisect
+
+import analytics
+import background
+import columnar
+import downsample
+import exports
+import importer
+import metrics
+import sheets
+import shards
+import simulate
+import timeline
+from datacache import DataCache
+from model import CITIES
+from writer import Writer
+
+# leaderboard rows visible at once, the rest scroll
+LEADERBOARD_ROWS = 20
+
+# dec index, or previous search match
 def get_prev_game():
-    if st.session_state["gameIndex"] > 0:
+    matches = st.session_state.get("matches")
+    if matches:
+        i = bisect.bisect_left(matches, st.session_state["gameIndex"])
+        if i > 0: st.session_state["gameIndex"] = matches[i - 1]
+    elif st.session_state["gameIndex"] > 0:
         st.session_state["gameIndex"] -= 1
 
-# inc indexx
+# inc indexx, or next search match
 def get_next_game():
-    if st.session_state["gameIndex"] < st.session_state["gameCount"] - 1:
+    matches = st.session_state.get("matches")
+    if matches:
+        i = bisect.bisect_right(matches, st.session_state["gameIndex"])
+        if i < len(matches): st.session_state["gameIndex"] = matches[i]
+    elif st.session_state["gameIndex"] < st.session_state["gameCount"] - 1:
         st.session_state["gameIndex"] += 1
 
-# dictionary deep copy
-def deep_copy(original):
-    # base case
-    if not isinstance(original, dict):
-        return original
-    
-    # recurse
-    copy = {}
-    for key, value in original.items():
-        if isinstance(value, dict):
-            copy[key] = deep_copy(value)
-        elif isinstance(value, list):
-            copy[key] = [deep_copy(item) if isinstance(item, dict) else item for item in value]
-        else:
-            copy[key] = value
-    return copy
-
-# calculate mean score in game
-def calculate_mean(game):
-    total = 0
-    players = 0
-    for player in game["Players"]:
-        total += float(player["Score"])
-        players += 1
-
-    return total / players
-
-# calculate average values for player stats
-def calculate_avgs(stats):
-    for p in stats:
-        # player avg stats
-        player = stats[p]
-        player["Average Points"] = round(player["Total Points"] / player["Games"], 2)
-        player["Average Delta"] = round(player["Average Delta"] / player["Games"], 2)
-
-    return stats
-
 # calculate leaderboard statistics
+@metrics.timed()
 def calculate_stats():
-    # lists
-    data = st.session_state["data"]
-    player_stats = {}
-    player_comps = {}
-    delta_stats = {}
-    delta_comps = {}
-
-    # loop games
-    for i, game in enumerate(data["Games"]):
-        # delta data: save data omitting last game
-        if i == st.session_state["gameCount"] - 1:
-            delta_stats = deep_copy(player_stats)
-            delta_comps = deep_copy(player_comps)
-
-        # calculate mean
-        mean = calculate_mean(game)
-
-        # loop
-        winscore = 0
-        for player in game["Players"]:
-            # player stats
-            if player["Name"] not in player_stats:
-                player_stats[player["Name"]] = {
-                    "Wins":0,"Average Points":0,"Average Delta":0,
-                    "Highscore":0,"Games":0,"Total Points":0}
-            
-            # comp stats: new player
-            if player["Name"] not in player_comps:
-                player_comps[player["Name"]] = {
-                    player["City"]: {
-                        "Wins":0,"Games":0,"Points":0,"Total Delta":0,"Wonders":0,"Gold":0,
-                        "War":0,"Blue":0,"Yellow":0,"Green":0,"Purple":0}}
-
-            # comp stats: new city
-            elif player["City"] not in player_comps[player["Name"]]:
-                player_comps[player["Name"]][player["City"]] = {
-                        "Wins":0,"Games":0,"Points":0,"Total Delta":0,"Wonders":0,"Gold":0,
-                        "War":0,"Blue":0,"Yellow":0,"Green":0,"Purple":0}
-
-            # player stats
-            stats = player_stats[player["Name"]]
-            stats["Games"] += 1
-            stats["Total Points"] += float(player["Score"])
-            stats["Average Delta"] += float(player["Score"] - mean)
-            if player["Score"] > stats["Highscore"]: stats["Highscore"] = player["Score"]
-            
-            # comp stats
-            player_comps[player["Name"]][player["City"]]["Points"] += player["Score"]
-            player_comps[player["Name"]][player["City"]]["Games"] += 1
-            player_comps[player["Name"]][player["City"]]["Total Delta"] += float(player["Score"] - mean)
-
-            # comp breakdown stats
-            for category in player["Breakdown"]:
-                player_comps[player["Name"]][player["City"]][category] += player["Breakdown"][category]
-                
-            # win stats
-            if not winscore or winscore == player["Score"]:
-                winscore = player["Score"]
-                stats["Wins"] += 1
-                player_comps[player["Name"]][player["City"]]["Wins"] += 1
-
-    # calculate averages
-    player_stats = calculate_avgs(player_stats)
-    delta_stats = calculate_avgs(delta_stats)
-
-    return player_stats, player_comps, delta_stats, delta_comps
+    return st.session_state["engine"].results()
+
+# selected group/season
+def active_shard():
+    return st.session_state.get("shard", shards.DEFAULT)
+
+# leaderboard statistics, summed over every shard when combined
+@metrics.timed()
+def combined_stats():
+    return ready(stats_task())
+
+# combined_stats in the background
+def stats_task():
+    engine = st.session_state["engine"]
+    if not st.session_state.get("all_shards"):
+        return task("stats", engine.results)
+    return tasks().submit("combined stats", combined_key(), shards.combined_results, shards.list_shards(), active_shard(), engine)
+
+# every shard and its stored version, what combined views depend on; the active shard's is the
+# version of the engine this rerun read, so a task never pairs one version with another's engine
+def combined_key():
+    active = active_shard()
+    return [(name, "active", st.session_state["base"]) if name == active else (name, shard_storage(name).version()) for name in shards.list_shards()]
+
+# background pool for page aggregates, shared by all sessions
+@st.cache_resource
+def tasks():
+    return background.Tasks()
+
+# start function(*args) over the active shard's current data in the background, or join the run already going
+def task(name, function, *args):
+    return tasks().submit(name, (active_shard(), st.session_state["base"], *args), function, *args)
+
+# result of a background task, a spinner in its place until it is ready
+def ready(future, text="Calculating..."):
+    if not future.done():
+        with st.spinner(text):
+            return future.result()
+    return future.result()
+
+# tab bar that only runs the open tab's body, st.tabs runs all of them
+def lazy_tabs(labels, key):
+    return st.radio("Tab:", labels, key=key, horizontal=True, label_visibility="collapsed")
+
+# storage backend per shard: json snapshot + journal, or sqlite (TRACKER_STORAGE)
+@st.cache_resource
+def shard_storage(name):
+    return shards.shard_storage(name)
+
+# process-wide data cache per shard, shared by all sessions
+@st.cache_resource
+def shard_cache(name):
+    return DataCache(shard_storage(name))
+
+# single writer per shard, every session's changes go through its queue
+@st.cache_resource
+def shard_writer(name):
+    return Writer(shard_storage(name), shard_cache(name))
+
+# active shard's storage, data cache and writer
+def storage():
+    return shard_storage(active_shard())
+
+def data_cache():
+    return shard_cache(active_shard())
+
+def writer():
+    return shard_writer(active_shard())
+
+# submit a change based on the data this session last read, None if it was rejected
+def write(entry):
+    try:
+        return writer().submit(entry, st.session_state.get("base"))
+    except importer.UploadError as err:
+        st.info("Error with entry")
+        st.dataframe(pd.DataFrame(err.errors, columns=["Row", "Error"]), hide_index=True, use_container_width=True)
+    except Exception as err:
+        st.info(str(err))
+    return None
+
+# flattened player rows of every game, built in the background once per shard and data version
+def game_table(shard, base, games):
+    return ready(tasks().submit("game table", (shard, base), columnar.game_table, games))
+
+# search, jump to and step through games; returns the current game's rows, None when nothing matches
+@metrics.timed()
+def seek_games(key):
+    frame, starts = game_table(active_shard(), st.session_state["base"], st.session_state["data"]["Games"])
+
+    # search by player or city
+    query = st.text_input("Search player or city:", key=f"{key}_search")
+    matches = columnar.find_games(frame, query).tolist() if query else None
+    if matches == []:
+        st.session_state["matches"] = None
+        st.info("No games match")
+        return None
+    if matches and st.session_state.get("matches") != matches and st.session_state["gameIndex"] not in matches:
+        # new search, start at the latest match
+        st.session_state["gameIndex"] = matches[-1]
+    st.session_state["matches"] = matches
+
+    # seek buttons and jump to game
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        st.button("Previous", key=f"{key}_prev", on_click=get_prev_game, use_container_width=True)
+    with c2:
+        number = st.number_input("Game Number:", label_visibility="collapsed", min_value=1, max_value=st.session_state["gameCount"],
+                                 value=st.session_state["gameIndex"] + 1, key=f"{key}_jump_{st.session_state['gameIndex']}")
+        st.session_state["gameIndex"] = number - 1
+    with c3:
+        st.button("Next", key=f"{key}_next", on_click=get_next_game, use_container_width=True)
+
+    caption = f"Game {st.session_state['gameIndex'] + 1} of {st.session_state['gameCount']}"
+    if matches: caption += f", {len(matches)} matching games"
+    st.caption(caption)
+
+    return columnar.game_slice(frame, starts, st.session_state["gameIndex"])
 
 # update essential session vars
+@metrics.timed()
 def update_vars():
-    # get data and sort
-    with open("games.json", "r") as file:
-        data = json.load(file)
-        for game in data["Games"]:
-            game["Players"] = sorted(game["Players"], key=lambda player: player["Score"], reverse=True)
-        st.session_state["data"] = data
-
-    # initial vars
-    if "gameIndex" not in st.session_state: 
-        count = len(data["Games"])
+    # the shared data and engine, parsed and sorted only when the stored version changes; held for
+    # this rerun only, sessions keep just the version and their editors' changes in between
+    data, engine, base = writer().read()
+    st.session_state["data"] = data
+    st.session_state["engine"] = engine
+    st.session_state["base"] = base
+
+    # initial vars, start at the last game when the shard changes
+    count = len(data["Games"])
+    if "gameIndex" not in st.session_state or st.session_state.get("loaded_shard") != active_shard():
         st.session_state["gameIndex"] = count - 1
-        st.session_state["gameCount"] = count
+        st.session_state["loaded_shard"] = active_shard()
+
+    # other sessions may have added or deleted games
+    st.session_state["gameCount"] = count
+    st.session_state["gameIndex"] = max(0, min(st.session_state["gameIndex"], count - 1))
 
 # statistics page
 def stats_page():
     # page config
     st.header("Statistics")
-    tab1, tab2 = st.tabs(["Leaderboard", "Games"])
+    tab = lazy_tabs(["Leaderboard", "Games", "Head to Head"], "stats_tab")
     update_vars()
 
+    # heavy aggregates start in the background whichever tab is open, the others are ready when opened
+    stats_task()
+    if not st.session_state.get("all_shards"):
+        engine = st.session_state["engine"]
+        ratings_task = task("ratings", engine.ratings)
+        task("head to head", engine.head_to_head)
+        tasks().submit("game table", (active_shard(), st.session_state["base"]), columnar.game_table, st.session_state["data"]["Games"])
+
     # tabs
-    with tab1:
+    if tab == "Leaderboard":
         # leaderboard
-        stats, comps, _, _ = calculate_stats()
-        df = pd.DataFrame(stats).T
-        st.dataframe(df.sort_values(by="Wins", ascending=False), use_container_width=True, height=len(df)*39)
-
-    with tab2:
-        # seek buttons
-        c1, c2, c3 = st.columns(3)
-        with c1:
-            st.button("Previous", on_click=get_prev_game, use_container_width=True)
-        with c2:
-            st.button(f"Game Number: {st.session_state["gameIndex"] + 1}/{st.session_state["gameCount"]}", disabled=True, use_container_width=True)
-        with c3:
-            st.button("Next", on_click=get_next_game, use_container_width=True)
+        stats, comps, _, _ = combined_stats()
+        if not stats:
+            st.info("No games yet")
+        else:
+            # any run of games, optionally against another, from the engine's prefix sums
+            count = st.session_state["gameCount"]
+            span = (1, count)
+            compare = None
+            at = count
+            if not st.session_state.get("all_shards") and count > 1:
+                at = st.slider("As of game:", 1, count, count, help="Scrub through the leaderboard's history")
+                with st.expander("Game Range"):
+                    span = st.slider("Games:", 1, count, (1, count))
+                    if st.toggle("Compare with other games"):
+                        compare = st.slider("Against:", 1, count, (1, max(1, span[0] - 1)))
+
+            if span != (1, count) or compare:
+                # the prefix sums are built once per data version, off the script thread
+                engine = st.session_state["engine"]
+                stats, _ = ready(task("ranges", engine.range_results, span[0] - 1, span[1]))
+                base = ready(task("ranges", engine.range_results, compare[0] - 1, compare[1]))[0] if compare else None
+                df = analytics.range_leaderboard(stats, base)
+            elif at < count:
+                ready(ratings_task)
+                stats, _, ratings = ready(task("as of", engine.as_of, at))
+                df = analytics.leaderboard(stats, ratings)
+            else:
+                # ratings depend on game order, so only within one shard
+                ratings = None if st.session_state.get("all_shards") else ready(ratings_task)
+                df = analytics.leaderboard(stats, ratings)
+            # fixed height, the grid only draws the rows in view
+            metrics.size("table:leaderboard", frame_bytes(df))
+            st.dataframe(df, use_container_width=True, height=min(len(df), LEADERBOARD_ROWS)*35 + 38)
+
+    elif tab == "Games":
+        if not st.session_state["gameCount"]:
+            st.info("No games yet")
+            return
 
         # game data
-        df = pd.DataFrame(st.session_state["data"]["Games"][st.session_state["gameIndex"]]["Players"])
-        breakdown_df = df["Breakdown"].apply(pd.Series)
-        df = pd.concat([df.drop(columns=["Breakdown"]), breakdown_df], axis=1)
-        st.dataframe(df, hide_index=True, use_container_width=True)
-
-    st.divider()
+        df = seek_games("games")
+        if df is not None:
+            metrics.size("table:games", frame_bytes(df))
+            st.dataframe(df, hide_index=True, use_container_width=True)
 
-# get match history
-def get_history():
-    scores = {}
-    places = {}
-
-    # loop
-    for game in st.session_state["data"]["Games"]:
-        # vars
-        winscore = 0
-        place = 1
-
-        # loop
-        for player in game["Players"]:
-            if player["Name"] not in scores: 
-                scores[player["Name"]] = [player["Score"]]
-                places[player["Name"]] = []
-
-            else: scores[player["Name"]].append(player["Score"])
-
-            # winner
-            if not winscore:
-                winscore = player["Score"]
-                places[player["Name"]].append(place)
-            
-            # tie for win
-            elif player["Score"] == winscore: places[player["Name"]].append(place)
-            
-            # else
-            else:
-                place += 1
-                places[player["Name"]].append(place)
-                
+    else:
+        head_to_head()
 
-    return scores, places
+    st.divider()
 
-# plot match history graph
-def plot_history(stats, scores, places):
-    # data
+# heatmap of row player against column player
+@metrics.timed()
+def plot_head_to_head(tables, names, metric):
+    size = len(names)
     data = pd.DataFrame({
-        "Index": range(1, stats["Games"] + 1),
-        "Score": scores,
-        "Place": places
-    })
+        "Player":[name for name in names for _ in range(size)],
+        "Opponent":names * size,
+        "Games":tables["Games"].ravel(),
+        metric:tables[metric].ravel()})
+    data = data[data["Games"] > 0]
+    metrics.size("chart:head_to_head", frame_bytes(data))
+
+    # rates and margins diverge around an even matchup
+    if metric == "Games":
+        scale = alt.Scale(scheme="blues")
+    else:
+        scale = alt.Scale(scheme="redblue", domainMid=50 if metric == "Ahead Rate" else 0)
+
+    chart = alt.Chart(data).mark_rect().encode(
+        x=alt.X("Opponent:N", sort=names),
+        y=alt.Y("Player:N", sort=names),
+        color=alt.Color(f"{metric}:Q", scale=scale),
+        tooltip=["Player", "Opponent", "Games", metric])
+    st.altair_chart(chart, use_container_width=True)
 
-    # score line and points
-    score_line = (alt.Chart(data).mark_line(color="lightblue")
+# head to head tab: heatmap over the most active players and one pair in detail
+def head_to_head():
+    if st.session_state.get("all_shards"):
+        st.info("Head to head is shown per group or season")
+        return
+    engine = st.session_state["engine"]
+    stats, _, _, _ = engine.results()
+    if len(stats) < 2:
+        st.info("Not enough players yet")
+        return
+
+    # most games first, the heatmap only holds a readable number of players
+    names = sorted(stats, key=lambda name: stats[name]["Games"], reverse=True)
+    c1, c2 = st.columns(2)
+    metric = c1.selectbox("Metric:", ["Ahead Rate", "Average Margin", "Games"])
+    count = c2.number_input("Players:", min_value=2, max_value=len(names), value=min(len(names), LEADERBOARD_ROWS))
+    shown = names[:count]
+    # the table started in the background by stats_page
+    h2h = ready(task("head to head", engine.head_to_head))
+    plot_head_to_head(h2h.tables([engine.ids[name] for name in shown]), shown, metric)
+
+    # one pair
+    c1, c2 = st.columns(2)
+    player = c1.selectbox("Player:", names)
+    opponent = c2.selectbox("Opponent:", [name for name in names if name != player])
+    tables = h2h.tables([engine.ids[player], engine.ids[opponent]])
+    games = int(tables["Games"][0, 1])
+    if not games:
+        st.info(f"{player} and {opponent} have not played together")
+        return
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Games Together", games)
+    c2.metric(f"{player} Ahead", int(tables["Ahead"][0, 1]))
+    c3.metric(f"{opponent} Ahead", int(tables["Ahead"][1, 0]))
+    c4.metric("Average Margin", tables["Average Margin"][0, 1], help=f"{player}'s score minus {opponent}'s")
+
+# plot match history graph from one shared, downsampled dataset, drag over the strip below to zoom
+@metrics.timed()
+def plot_history(stats, scores, places, ratings=None, budget=downsample.POINT_BUDGET):
+    # data, at most a few budgets of rows whatever the history length
+    columns = {"Index": range(1, len(scores) + 1), "Score": scores, "Place": places}
+    if ratings: columns["Rating"] = ratings
+    data = pd.DataFrame(columns)
+    data = data.iloc[downsample.downsample(data["Index"], [data[column] for column in columns if column != "Index"], budget)]
+    metrics.size("chart:history", frame_bytes(data))
+
+    # game range brush shared by every panel
+    brush = alt.selection_interval(encodings=["x"])
+    x = alt.X("Index", title="Game", axis=alt.Axis(format="d"), scale=alt.Scale(domain=brush))
+
+    # score and place lines with points
+    score = (alt.Chart().mark_line(color="lightblue", point=alt.OverlayMarkDef(filled=True, size=50, color="lightblue", opacity=1))
         .encode(
-            x=alt.X("Index", title="Game", axis=alt.Axis(format="d")),
+            x=x,
             y=alt.Y("Score", title="Score", scale=alt.Scale(domain=[min(scores) - 5, max(scores) + 5]), axis=alt.Axis(format="d", labelColor="lightblue")),
         )
     )
-    score_points = (alt.Chart(data).mark_point(filled=True, size=50, color="lightblue", opacity=1)
+    place = (alt.Chart().mark_line(color="yellow", point=alt.OverlayMarkDef(filled=True, size=50, color="yellow", opacity=1))
         .encode(
-            x=alt.X("Index", title="Game", axis=alt.Axis(format="d")),
-            y=alt.Y("Score", title="Score", scale=alt.Scale(domain=[min(scores) - 5, max(scores) + 5]), axis=alt.Axis(format="d", labelColor="lightblue")),
+            x=x,
+            y=alt.Y("Place", title="Place", scale=alt.Scale(reverse=True, domain=[1, max(places) + 1]), axis=alt.Axis(format="d", labelColor="yellow")),
         )
     )
+    panels = [alt.layer(score, place).resolve_scale(y="independent")]
+
+    # rating line
+    if ratings:
+        panels.append(alt.Chart().mark_line(color="lightgreen", point=True)
+            .encode(
+                x=x,
+                y=alt.Y("Rating", title="Rating", scale=alt.Scale(zero=False), axis=alt.Axis(format="d", labelColor="lightgreen")),
+            )
+            .properties(height=150)
+        )
 
-    # place line and points
-    place_line = (
-        alt.Chart(data)
-        .mark_line(color="yellow")
+    # overview strip with the brush
+    overview = (alt.Chart().mark_area(color="lightblue", opacity=0.5)
         .encode(
-            x=alt.X("Index", title="Game", axis=alt.Axis(format="d")),
-            y=alt.Y("Place", title="Place", scale=alt.Scale(reverse=True, domain=[1, max(places) + 1]), axis=alt.Axis(format="d", labelColor="yellow")),
+            x=alt.X("Index", title=None, axis=alt.Axis(format="d")),
+            y=alt.Y("Score", title=None, scale=alt.Scale(zero=False), axis=None),
+        )
+        .add_params(brush)
+        .properties(height=50)
+    )
+
+    # one dataset at the top of the spec, every panel reads it
+    chart = alt.vconcat(*panels, overview, data=data)
+    st.altair_chart(chart, use_container_width=True)
+
+# plot rolling average points and win rate, downsampled like the match history
+@metrics.timed()
+def plot_form(form, window, budget=downsample.POINT_BUDGET):
+    data = pd.DataFrame({
+        "Game": form["Game"],
+        "Average Points": form["Average Points"],
+        "Win Rate": form["Win Rate"]
+    })
+    data = data.iloc[downsample.downsample(data["Game"], [data["Average Points"], data["Win Rate"]], budget)]
+    metrics.size("chart:form", frame_bytes(data))
+
+    points_line = (alt.Chart().mark_line(color="lightblue")
+        .encode(
+            x=alt.X("Game", title="Game", axis=alt.Axis(format="d")),
+            y=alt.Y("Average Points", title=f"Last {window} Average Points", scale=alt.Scale(zero=False), axis=alt.Axis(labelColor="lightblue")),
         )
     )
-    place_points = (alt.Chart(data).mark_point(filled=True, size=50, color="yellow", opacity=1)
+    win_line = (alt.Chart().mark_line(color="yellow")
         .encode(
-            x=alt.X("Index", title="Game", axis=alt.Axis(format="d")),
-            y=alt.Y("Place", title="Place", scale=alt.Scale(reverse=True, domain=[1, max(places) + 1]), axis=alt.Axis(format="d", labelColor="yellow")),
+            x=alt.X("Game", title="Game", axis=alt.Axis(format="d")),
+            y=alt.Y("Win Rate", title=f"Last {window} Win Rate (%)", scale=alt.Scale(domain=[0, 100]), axis=alt.Axis(labelColor="yellow")),
         )
     )
 
-    # plot
-    chart = alt.layer(score_line + score_points, place_line + place_points).resolve_scale(y="independent")
+    chart = alt.layer(points_line, win_line, data=data).resolve_scale(y="independent")
     st.altair_chart(chart, use_container_width=True)
 
-# get synergy
-def find_synergy(comp):
-    categories = ["Wonders", "Gold", "War", "Blue", "Yellow", "Green", "Purple"]
+# one player's stats, comps and history from indexed queries
+def get_player(store, name):
+    last = st.session_state["gameCount"] - 1
+    stats = {name: store.player_stats(name)}
+    comps = {name: store.player_comps(name)}
+    delta_stats = {name: store.player_stats(name, before=last)}
+    delta_comps = {name: store.player_comps(name, before=last)}
+    scores, places = store.player_history(name)
 
-    # find the category with the highest point value
-    highest_category = max(categories, key=lambda category: comp[category])
-    return highest_category
-
-# analyzes comp data for best comp
-def read_comps(comps):
-    # vars
-    max_wins = 0
-    avg_pts = 0
-    best = "?"
-    
-    # loop
-    for comp in comps:
-        if comp == "?": continue
-        if comps[comp]["Wins"] > max_wins:
-            best = comp
-            avg_pts = round(float(comps[comp]["Points"])/comps[comp]["Games"], 2)
-
-        elif comps[comp]["Wins"] == max_wins:
-            temp = round(float(comps[comp]["Points"])/comps[comp]["Games"], 2)
-            if temp > avg_pts:
-                best = comp
-                avg_pts = temp
-            
-    return best
-
-# return distribution of synergy points
-def get_distribution(name, comps):
-    distribution = {"Wonders":0,"Gold":0,"War":0,"Blue":0,"Yellow":0,"Green":0,"Purple":0}
-    points = 0
-    for i, comp in enumerate(comps[name]):
-        points += comps[name][comp]["Points"]
-        for key in distribution:
-            distribution[key] += comps[name][comp][key]
-            if i == len(comps[name]) - 1:
-                distribution[key] = round(100 * float(distribution[key])/points)
-
-    return distribution
+    return stats, comps, delta_stats, delta_comps, {name: scores}, {name: places}
 
 # people page
 def chart_page():
     # get data
     update_vars()
-    stats, comps, delta_stats, delta_comps = calculate_stats()
-    scores, places = get_history()
+    store = storage()
+    if store.indexed:
+        names = store.player_names()
+    else:
+        stats, comps, delta_stats, delta_comps = calculate_stats()
+        names = stats.keys()
+    if not names:
+        st.info("No games yet")
+        return
 
     # player select
     st.header("Overview")
-    name = st.selectbox(label="Select Player:", label_visibility="collapsed", options=stats.keys())
-    
-    # metric columns: value - old (delta) value
-    c1, c2, c3, c4 = st.columns(4)
+    name = st.selectbox(label="Select Player:", label_visibility="collapsed", options=names)
+    series = st.session_state["engine"].series(name)
+    if store.indexed:
+        stats, comps, delta_stats, delta_comps, scores, places = get_player(store, name)
+    else:
+        # only the selected player's history, from the engine's per player index
+        scores, places = {name: series["Score"]}, {name: series["Place"]}
 
-    # c1: wins
-    delta = stats[name]["Wins"] - delta_stats[name]["Wins"]
-    c1.metric("Wins", stats[name]["Wins"], delta if delta else None)
-    
-    # c2: win rate
-    win_rate = round(100 * stats[name]["Wins"] / stats[name]["Games"], 2)
-    delta_win_rate = round(100 * delta_stats[name]["Wins"] / delta_stats[name]["Games"], 2)
-    delta = round(win_rate - delta_win_rate, 2)
-    c2.metric("Win Rate", str(win_rate) + "%", str(delta) + "%" if delta else None)
-    
-    # c3, c4: avg points and delta
-    delta = round(stats[name]["Average Points"] - delta_stats[name]["Average Points"], 2)
-    c3.metric("Average Points", stats[name]["Average Points"], delta if delta else None)
-    delta = round(stats[name]["Average Delta"] - delta_stats[name]["Average Delta"], 2)
-    c4.metric("Average Delta", stats[name]["Average Delta"], delta if delta else None)
+    overview = analytics.player_overview(name, stats, comps, delta_stats, delta_comps)
+
+    # metric columns: value - old (delta) value
+    c1, c2, c3, c4, c5 = st.columns(5)
+    history = st.session_state["engine"].rating_history(name)
+    last = [player["Name"] for player in st.session_state["data"]["Games"][-1]["Players"]]
+    delta = history[-1] - history[-2] if name in last and len(history) > 1 else None
+    c1.metric("Rating", history[-1], delta if delta else None)
+    value, delta = overview["Wins"]
+    c2.metric("Wins", value, delta if delta else None)
+    value, delta = overview["Win Rate"]
+    c3.metric("Win Rate", str(value) + "%", str(delta) + "%" if delta else None)
+    value, delta = overview["Average Points"]
+    c4.metric("Average Points", value, delta if delta else None)
+    value, delta = overview["Average Delta"]
+    c5.metric("Average Delta", value, delta if delta else None)
 
     # match history
     st.divider()
     st.header("Match History")
-    plot_history(stats[name], scores[name], places[name])
+    plot_history(stats[name], scores[name], places[name], history)
+
+    st.divider()
+
+    # rolling form
+    st.header("Form")
+    window = st.select_slider("Window:", options=[5, 10, 20, 50, 100], value=10)
+    form = timeline.form(series, window)
+    c1, c2, c3, c4, c5 = st.columns(5)
+    c1.metric(f"Last {window} Average Points", form["Average Points"][-1])
+    c2.metric(f"Last {window} Win Rate", str(form["Win Rate"][-1]) + "%")
+    c3.metric(f"Last {window} Average Delta", form["Average Delta"][-1])
+    c4.metric("Win Streak", int(form["Win Streak"][-1]), help=f"Longest: {form['Longest Win Streak']}")
+    c5.metric("Games Without Win", int(form["Loss Streak"][-1]), help=f"Longest: {form['Longest Loss Streak']}")
+    plot_form(form, window)
 
     st.divider()
 
     # c5, c6: best/favorite
-    best = read_comps(comps[name])
-    syn = find_synergy(comps[name][best])
     c5, c6 = st.columns(2)
-    c5.metric("Most Successful Comp", best)
-    c6.metric("Synergy", syn)
+    c5.metric("Most Successful Comp", overview["Most Successful Comp"])
+    c6.metric("Synergy", overview["Synergy"])
 
     # c7, c8, c9, c10: win rates and avg points
     c7, c8, c9, c10 = st.columns(4)
-    games = comps[name][best]["Games"]
-    c7.metric("Win Rate", str(round(100 * float(comps[name][best]["Wins"])/games, 2)) + "%")
-    c8.metric("Average Points", round(float(comps[name][best]["Points"])/games, 2))
-    c9.metric("Average Delta", round(float(comps[name][best]["Total Delta"])/games, 2))
-    c10.metric("Average Synergy Points", round(float(comps[name][best][syn])/games, 2))
+    c7.metric("Win Rate", str(overview["Comp Win Rate"]) + "%")
+    c8.metric("Average Points", overview["Comp Average Points"])
+    c9.metric("Average Delta", overview["Comp Average Delta"])
+    c10.metric("Average Synergy Points", overview["Comp Synergy Points"])
     
     st.divider()
 
-    # get synergy distribution
-    distribution = get_distribution(name, comps)
-    delta_distribution = get_distribution(name, delta_comps)
-
     # synergy distribution
     cols = st.columns(7)
-    categories = ["Wonders", "Gold", "War", "Blue", "Yellow", "Green", "Purple"]
-    for i, cat in enumerate(categories):
-        delta = round(delta_distribution[cat] - distribution[cat], 1)
-        cols[i].metric(cat, str(distribution[cat]) + "%", str(delta) + "%" if delta else None)
+    for i, (cat, (value, delta)) in enumerate(overview["Distribution"].items()):
+        cols[i].metric(cat, str(value) + "%", str(delta) + "%" if delta else None)
 
 # plot pie chart visualizing synergies
+@metrics.timed()
 def plot_synergies(breakdown, points):
     print(breakdown)
     normalized = {category: (value / points) * 100 for category, value in breakdown.items()}
@@ -389,130 +511,172 @@ def plot_synergies(breakdown, points):
     # Display the chart in Streamlit
     st.altair_chart(chart, use_container_width=True)
 
-# consolidates comp data and calculates average delta
-def process_comps(comps):
-    maps = {}
-    for player in comps:
-        for comp in comps[player]:
-            if comp not in maps:
-                maps[comp] = {"Wins":0,"Games":0,"Points":0,"Total Delta":0,"Wonders":0,"Gold":0,
-                                "War":0,"Blue":0,"Yellow":0,"Green":0,"Purple":0}
-            for feature in comps[player][comp]:
-                maps[comp][feature] += comps[player][comp][feature]
-    
-    for comp in maps:
-        maps[comp]["Average Delta"] = round(maps[comp]["Total Delta"]/maps[comp]["Games"], 2)
-
-    return maps
-
-# produces tier list params
-def get_tier_params(maps):
-    tiers = []
-    for comp in maps:
-        if comp != "?":
-            tiers.append((comp, maps[comp]["Average Delta"]))
-
-    low = min(tiers, key=lambda x: x[1])
-    high = max(tiers, key=lambda x: x[1])
-
-    return low[1], high[1]
-
-def tier_function(low, high, value):
-    normalized = 100* (value + abs(low)) / (high + abs(low))
-    if normalized > 80: return "S", normalized
-    elif normalized > 50: return "A", normalized
-    else: return "B", normalized
+# composition view of one shard's stored data, run in the background
+@metrics.timed()
+def comp_view(store, path):
+    if store.indexed:
+        # per city sums straight from the database, the deltas leave out the last game
+        last = store.count() - 1
+        maps = {}
+        delta_maps = {}
+        for mode in sorted(importer.MODES):
+            comp = store.city_stats(mode)
+            if comp is None:
+                continue
+            maps[mode] = comp
+            old = store.city_stats(mode, before=last)
+            if old is not None:
+                delta_maps[mode] = old
+        return analytics.tier_table(maps, delta_maps)
+
+    frame = columnar.load_frame(store, path)
+    if frame.empty:
+        return {}
+    return analytics.tier_table(columnar.comp_maps(frame), columnar.comp_maps(columnar.without_last(frame)))
+
+# composition view over every shard, from per-shard totals, run in the background
+@metrics.timed()
+def combined_comp_view(names, active, engine):
+    _, comps, _, delta_comps = shards.combined_results(names, active, engine)
+    if not comps:
+        return {}
+    return analytics.tier_table(analytics.process_comps(comps), analytics.process_comps(delta_comps))
 
 # composition page
 def comp_page():
     # page config
     st.header("Compositions")
-    cities = ["Alexandria", "Babylon", "Ephesus", "Giza", "Halicarnassus", "Olympia", "Rhodes"]
-    tabs = st.tabs(cities)
+    cities = CITIES
+    city = lazy_tabs(cities, "comp_tab")
     update_vars()
 
-    # process data
-    _, comps, _, delta_comps = calculate_stats()
-    maps = process_comps(comps)
-    delta_maps = process_comps(delta_comps)
+    # materialized comp view for the current data version, built in the background
+    if st.session_state.get("all_shards"):
+        view = tasks().submit("combined comps", combined_key(), combined_comp_view, shards.list_shards(), active_shard(), st.session_state["engine"])
+    else:
+        store = storage()
+        view = tasks().submit("comps", (active_shard(), store.version()), comp_view, store, shards.shard_path(active_shard()) + ".parquet")
+    view = ready(view)
 
-    # tabs
-    for i, city, in enumerate(cities):
-        with tabs[i]:
-            breakdown = {"Wonders":0,"Gold":0,"War":0,"Blue":0,"Yellow":0,"Green":0,"Purple":0}
-            points = 0
-            times = ["Day", "Night"]
-
-            # day and night
-            for j in range(2):
-                st.subheader(f"{times[j]} Statistics")
-                c1, c2, c3 = st.columns(3)
-                mode = f"{city} {times[j]}"
-                if mode not in maps:
-                    st.info(f"No data for {mode}")
-                    continue
-
-                # tier
-                low, high = get_tier_params(maps)
-                tier, power = tier_function(low, high, maps[mode]["Average Delta"])
-                powerbar = st.progress(0, text=f"Tier: {tier}")
-                for val in range(int(power)):
-                    time.sleep(0.01)
-                    powerbar.progress(val, text=f"Tier: {tier}")
-
-                # win rate and delta
-                games = maps[mode]["Games"]
-                win_rate = round(100 * float(maps[mode]["Wins"])/games, 2)
-                if mode in delta_maps: delta = round(win_rate - (100 * float(delta_maps[mode]["Wins"])/games), 2)
-                else: delta = None
-                c1.metric("Win Rate", str(win_rate) + "%", delta if delta else None)
-
-                # average points and delta
-                average_points = round(float(maps[mode]["Points"])/games, 2)
-                if mode in delta_maps: delta = round(average_points - float(delta_maps[mode]["Points"])/games, 2)
-                else: delta = None
-                c2.metric("Average Points", average_points, delta if delta else None)
-
-                # average delta and delta
-                average_delta = maps[mode]["Average Delta"]
-                if mode in delta_maps: delta = round(average_delta - delta_maps[mode]["Average Delta"], 2)
-                else: delta = None
-                c3.metric("Average Delta", average_delta, delta if delta else None)
-            
-                for key in breakdown: breakdown[key] += maps[mode][key]
-                points += maps[mode]["Points"]
-
-                st.divider()
-
-            # synergies
-            st.subheader("Synergy Distribution")
-            plot_synergies(breakdown, points)
-            
-# submit new entry
+    # open tab only
+    breakdown = {"Wonders":0,"Gold":0,"War":0,"Blue":0,"Yellow":0,"Green":0,"Purple":0}
+    points = 0
+    times = ["Day", "Night"]
+
+    # day and night
+    for j in range(2):
+        st.subheader(f"{times[j]} Statistics")
+        c1, c2, c3 = st.columns(3)
+        mode = f"{city} {times[j]}"
+        if mode not in view:
+            st.info(f"No data for {mode}")
+            continue
+
+        # tier
+        row = view[mode]
+        st.progress(min(max(int(row["Power"]), 0), 100), text=f"Tier: {row["Tier"]}")
+
+        # win rate, average points and average delta with deltas
+        c1.metric("Win Rate", str(row["Win Rate"]) + "%", row["Win Rate Delta"] if row["Win Rate Delta"] else None)
+        c2.metric("Average Points", row["Average Points"], row["Average Points Delta"] if row["Average Points Delta"] else None)
+        c3.metric("Average Delta", row["Average Delta"], row["Average Delta Delta"] if row["Average Delta Delta"] else None)
+    
+        for key in breakdown: breakdown[key] += row[key]
+        points += row["Points"]
+
+        st.divider()
+
+    # synergies
+    st.subheader("Synergy Distribution")
+    if points:
+        plot_synergies(breakdown, points)
+    
+# simulated odds for a lineup, once per shard, data version and lineup; base and _engine must come from
+# the same writer().read(), the engine is left out of the cache key
+@metrics.timed()
+@st.cache_data(show_spinner="Simulating games...")
+def lineup_odds(shard, base, lineup, _engine):
+    pools, sources = simulate.score_pools(_engine, lineup)
+    return {**simulate.odds(pools), "Scores From": sources}
+
+# odds page: win probability and expected place from resampled past scores
+def odds_page():
+    st.header("Odds")
+    update_vars()
+    if st.session_state.get("all_shards"):
+        st.info("Odds are simulated per group or season")
+        return
+    names = list(st.session_state["engine"].results()[0])
+    if len(names) < 2:
+        st.info("Not enough players yet")
+        return
+
+    # lineup
+    players = st.multiselect("Players:", names, max_selections=7)
+    modes = ["?"] + [f"{city} {time}" for city in CITIES for time in ("Day", "Night")]
+    cols = st.columns(max(len(players), 1))
+    lineup = tuple((name, cols[i].selectbox(name, modes, key=f"odds_{name}")) for i, name in enumerate(players))
+    if len(lineup) < 2:
+        st.info("Pick at least two players")
+        return
+
+    odds = lineup_odds(active_shard(), st.session_state["base"], lineup, st.session_state["engine"])
+    df = pd.DataFrame({
+        "Player":[name for name, _ in lineup],
+        "City":[city for _, city in lineup],
+        "Win Probability":odds["Win Probability"],
+        "Expected Place":odds["Expected Place"],
+        "Scores From":odds["Scores From"]})
+    st.dataframe(df, hide_index=True, use_container_width=True)
+    st.caption(f"{odds['Games']:,} simulated games, each player's score drawn from their past games with that city "
+               f"(or all their games with fewer than {simulate.MIN_GAMES}); tied winners all count as winners")
+
+# blank rows for the add game editor
+def blank_players(num):
+    player_data = []
+    for i in range(num):
+        player_data.append({
+                "Name":f"Player {i + 1}",
+                "City": "?",
+                "Wonders":0,
+                "Gold":0,
+                "War":0,
+                "Blue":0,
+                "Yellow":0,
+                "Green":0,
+                "Purple":0,"Score":0})
+    return player_data
+
+# submit new entry: blank rows with this session's editor changes applied
 def add_entry():
     breakdown_cols = ["Wonders", "Gold", "War", "Blue", "Yellow", "Green", "Purple"]
     new_list = []
-    for player in st.session_state["new"]:
+    for player in columnar.apply_edits(blank_players(st.session_state["new_players"]), st.session_state.get("entry_add", {})):
         breakdown_dict = {key: player[key] for key in breakdown_cols}
         new_list.append({"Name":player["Name"],
                             "Score":player["Score"],
                             "City":player["City"],
                             "Breakdown": breakdown_dict})
 
-    new_entry = {"Number":st.session_state["gameCount"],"Players":new_list}
-    st.session_state["data"]["Games"].append(new_entry)
-    st.session_state["gameIndex"] = st.session_state["gameCount"]
-    st.session_state["gameCount"] += 1
-
-    with open("games.json", "w") as f:
-        json.dump(st.session_state["data"], f, indent=4)
-
-    st.info("Success!")
+    # numbered by the writer, so simultaneous submissions get distinct numbers
+    new_entry = {"Number":0,"Players":new_list}
+    entry = write({"op":"add","game":new_entry})
+    if entry:
+        st.session_state["gameIndex"] = entry["game"]["Number"] - 1
+        st.info("Success!")
 
-# submit saved changes
+# submit saved changes: the shown game with this session's editor changes applied
 def submit_edit():
+    data, _, base = writer().read()
+    index = st.session_state["gameIndex"]
+    if not 0 <= index < len(data["Games"]):
+        st.info(f"Game {index + 1} no longer exists")
+        return
+    frame, starts = game_table(active_shard(), base, data["Games"])
+    rows = columnar.game_slice(frame, starts, index).to_dict(orient="records")
+
     # convert flattened editor back into nested JSON
-    edited = pd.DataFrame(st.session_state["edited"]).to_dict(orient="records")
+    edited = columnar.apply_edits(rows, st.session_state.get("entry_edit", {}))
     breakdown_cols = ["Wonders", "Gold", "War", "Blue", "Yellow", "Green", "Purple"]
     for player in edited:
         breakdown_dict = {}
@@ -522,47 +686,44 @@ def submit_edit():
 
         player["Breakdown"] = breakdown_dict
 
-    st.session_state["data"]["Games"][st.session_state["gameIndex"]]["Players"] = edited
-
-    with open("games.json", "w") as f:
-        json.dump(st.session_state["data"], f, indent=4)
-
-    st.info("Success!")
+    if write({"op":"edit","index":st.session_state["gameIndex"],"players":edited}):
+        st.info("Success!")
 
 # confirm delete
 @st.dialog("Are you sure?")
 def delete():
     st.write(f"This will erase data for Game {st.session_state["gameIndex"] + 1}. This action cannot be undone.")
     if st.button("Confirm"):
-        for i in range(st.session_state["gameCount"] - 1, 0, -1):
-            if i == st.session_state["gameIndex"]:
-                del(st.session_state["data"]["Games"][i])
-                break
-            else:
-                st.session_state["data"]["Games"][i]["Number"] -= 1
-
-        st.session_state["gameCount"] -= 1
-        if st.session_state["gameIndex"] > 0: st.session_state["gameIndex"] -= 1
-
-        with open("games.json", "w") as f:
-            json.dump(st.session_state["data"], f, indent=4)
+        # later games are renumbered by the writer
+        if write({"op":"delete","index":st.session_state["gameIndex"]}):
+            st.session_state["gameCount"] -= 1
+            if st.session_state["gameIndex"] > 0: st.session_state["gameIndex"] -= 1
 
-        st.rerun()
+            st.rerun()
 
 # submit rename
 def rename():
     if st.session_state["new_name"] and st.session_state["new_name"] not in st.session_state["playerList"]:
-        for game in st.session_state["data"]["Games"]:
-            for player in game["Players"]:
-                if player["Name"] == st.session_state["old_name"]:
-                    player["Name"] = st.session_state["new_name"]
+        if write({"op":"rename","old":st.session_state["old_name"],"new":st.session_state["new_name"]}):
+            st.info("Success!")
 
-        with open("games.json", "w") as f:
-            json.dump(st.session_state["data"], f, indent=4)
-        
-        st.info("Success!")
+# create an empty shard and switch to it
+def new_shard():
+    try:
+        st.session_state["shard"] = shards.create_shard(st.session_state["new_group"], st.session_state["new_season"])
+    except ValueError as err:
+        st.info(str(err))
+        return
+
+    st.info("Success!")
 
 def upload_sheet():
+    # google client stack is only needed here, keep it off the import path
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+    from googleapiclient.discovery import build
+    from googleapiclient.errors import HttpError
+    from google.oauth2 import service_account
 
     SHEET_ID = st.session_state["sheet_name"]
     SCOPES = ["https://www.googleapis.com/auth/spreadsheets.readonly"]
@@ -611,42 +772,27 @@ def upload_sheet():
     
     try:
         service = build("sheets", "v4", credentials=credentials)
-        sheet = service.spreadsheets()
 
-        spreadsheet = service.spreadsheets().get(spreadsheetId=SHEET_ID).execute()
-        sheets = spreadsheet.get("sheets", [])
-        sheet_names = [sheet["properties"]["title"] for sheet in sheets]
+        # incremental mode skips sheets that were already imported; games stored before sheets
+        # were tagged can't be matched, so those are replaced in full once
+        data = writer().read()[0]
+        imported = sheets.imported(data)
+        merge = st.session_state["sheet_merge"] and (imported or not data["Games"])
+        Games = sheets.fetch_games(service, SHEET_ID, imported if merge else ())
 
-        Games = []
+        if merge:
+            # append new sheets to the existing games, numbered by the writer
+            if Games and not write({"op":"extend","games":Games}):
+                return
+            game_num = len(writer().read()[0]["Games"])
 
-        game_num = 0
-        for name in sheet_names[1::]:
-            SAMPLE_RANGE_NAME = name + "!A2:K8"
-            result = (
-            sheet.values()
-            .get(spreadsheetId=SHEET_ID, range=SAMPLE_RANGE_NAME)
-            .execute()
-        )
-            players = []
-            game_num += 1
-            for player in result['values']:
-                breakdown = {
-                        "Wonders": int(player[3]),
-                        "Gold": int(player[4]),
-                        "War": int(player[5]),
-                        "Blue": int(player[6]),
-                        "Yellow": int(player[7]),
-                        "Green": int(player[8]),
-                        "Purple": int(player[9])
-                    }
-                players.append({"Name":player[0],"Score":int(player[10]),"City":player[1] + " " + player[2],"Breakdown":breakdown})
-
-            Games.append({"Number": game_num, "Players": players})
-            
-
-        final_games = {"Games":Games}
-        with open("games.json", "w") as f:
-            json.dump(final_games, f, indent=4)
+        else:
+            for i, game in enumerate(Games):
+                game["Number"] = i + 1
+            game_num = len(Games)
+
+            if not write({"op":"replace","games":Games}):
+                return
 
         st.session_state["gameCount"] = game_num
         st.session_state["gameIndex"] = game_num - 1
@@ -654,18 +800,35 @@ def upload_sheet():
     except HttpError as err:
         print(err)
 
-# download CSV file
+# download exports, built once per data version and served from disk
 @st.dialog("Export Data")
 def download():
-    # produce leaderboard.csv
-    stats, comps, _, _ = calculate_stats()
-    df = pd.DataFrame(stats).T.sort_values(by="Wins", ascending=False)
-    csv_file = df.to_csv().encode("utf-8")
-    st.download_button(label="Download Leaderboard", data=csv_file, file_name="leaderboard.csv", use_container_width=True)
-    
-    # produce games.json
-    json_file = json.dumps(st.session_state["data"])
-    st.download_button(label="Download Game Data", data=json_file, file_name="games.json", use_container_width=True)
+    shard = active_shard()
+    # version and data from the same read, so an export is always labelled with what it holds
+    data, engine, base = writer().read()
+    version = (writer().epoch, base)
+    for name, label in [(name, label) for name, (label, _) in exports.ARTIFACTS.items()] + [("bundle.zip", "Download Everything (ZIP)")]:
+        try:
+            path = exports.artifact(name, shard, version, data, engine)
+        except ImportError:
+            # pyarrow missing, no parquet
+            continue
+        with open(path, "rb") as file:
+            st.download_button(label=label, data=file, file_name=name, use_container_width=True)
+
+# seek and edit the selected game
+def edit_game():
+    # seek
+    edit = seek_games("edit")
+    if edit is None:
+        return
+
+    # data editor, its changes stay in the session until submitted
+    st.data_editor(edit, key="entry_edit", hide_index=True, use_container_width=True)
+
+    # buttons
+    st.button("Submit Edit", on_click=submit_edit, use_container_width=True)
+    st.button("Delete Game", on_click=delete, use_container_width=True)
 
 # data management page
 def manage_data():
@@ -677,53 +840,23 @@ def manage_data():
         st.write(f"Game Number: {st.session_state["gameCount"] + 1}")
 
         # get player count and make table
-        num = st.number_input("Players:", value=1, min_value=1, max_value=10)
-        player_data = []
-        for i in range(num):
-            player_data.append({
-                    "Name":f"Player {i + 1}",
-                    "City": "?",
-                    "Wonders":0,
-                    "Gold":0,
-                    "War":0,
-                    "Blue":0,
-                    "Yellow":0,
-                    "Green":0,
-                    "Purple":0,"Score":0})
-
-        # store table edits
-        new_entry = {"Number":st.session_state["gameCount"] + 1, "Players":player_data}
-        st.session_state["new"] = st.data_editor(new_entry["Players"], key="entry_add", hide_index=True, use_container_width=True)
+        num = st.number_input("Players:", value=1, min_value=1, max_value=10, key="new_players")
+
+        # table edits stay in the session until submitted
+        st.data_editor(blank_players(num), key="entry_add", hide_index=True, use_container_width=True)
 
         # submit
         st.button("Submit Entry", on_click=add_entry, use_container_width=True)
 
     with st.expander("Edit Game"):
-        # seek
-        c1, c2, c3 = st.columns(3)
-        with c1:
-            st.button("Previous", on_click=get_prev_game, use_container_width=True)
-        with c2:
-            st.button(f"Game Number: {st.session_state["gameIndex"] + 1}/{st.session_state["gameCount"]}", disabled=True, use_container_width=True)
-        with c3:
-            st.button("Next", on_click=get_next_game, use_container_width=True)
-
-        # data editor
-        edit = pd.DataFrame(st.session_state["data"]["Games"][st.session_state["gameIndex"]]["Players"])
-        breakdown_df = edit["Breakdown"].apply(pd.Series)
-        edit = pd.concat([edit.drop(columns=["Breakdown"]), breakdown_df], axis=1)
-        st.session_state["edited"] = st.data_editor(edit, key="entry_edit", hide_index=True, use_container_width=True)
-
-        # buttons
-        st.button("Submit Edit", on_click=submit_edit, use_container_width=True)
-        st.button("Delete Game", on_click=delete, use_container_width=True)
+        if not st.session_state["gameCount"]:
+            st.info("No games yet")
+        else:
+            edit_game()
 
     with st.expander("Rename Player"):
-        # get player list
-        playerList = []
-        for game in st.session_state["data"]["Games"]:
-            for player in game["Players"]:
-                if player["Name"] not in playerList: playerList.append(player["Name"])
+        # get player list, in order of first appearance
+        playerList = list(calculate_stats()[0])
         st.session_state["playerList"] = playerList
 
         # name select
@@ -736,6 +869,16 @@ def manage_data():
         # submit
         st.button("Submit", on_click=rename, use_container_width=True)
 
+    with st.expander("New Group or Season"):
+        c1, c2 = st.columns(2)
+        with c1:
+            st.session_state["new_group"] = st.text_input(label="Group:")
+        with c2:
+            st.session_state["new_season"] = st.text_input(label="Season:")
+
+        # submit
+        st.button("Create", on_click=new_shard, use_container_width=True)
+
     # data download
     st.button("Export Data", on_click=download, use_container_width=True)
 
@@ -745,6 +888,7 @@ def manage_data():
         # name select
 
         st.session_state["sheet_name"] = st.text_input(label="Sheet ID:")
+        st.session_state["sheet_merge"] = st.checkbox("Only import new sheets", value=True, help="Sheets are tracked from the first full import onwards, data with no tracked sheets is replaced in full")
 
         # submit
         st.button("Submit Sheet", on_click=upload_sheet, use_container_width=True)
@@ -753,35 +897,88 @@ def manage_data():
     # data upload
     uploaded = st.file_uploader(label="Upload Game Data", type="json", accept_multiple_files=False)
     if uploaded is not None:
-        try:
-            # test new data
-            data = json.load(uploaded)
-            st.session_state["data"] = data
-            test = calculate_stats()
+        mode = st.radio("Upload mode:", ["Merge new games", "Replace all data"], horizontal=True)
+        if st.button("Import File", use_container_width=True):
+            try:
+                # stream and validate, nothing is written unless every row passes
+                uploaded.seek(0)
+                games, warnings = importer.read_games(uploaded)
+
+            except importer.UploadError as err:
+                # bad input
+                st.info("Error with input file")
+                st.dataframe(pd.DataFrame(err.errors, columns=["Row", "Error"]), hide_index=True, use_container_width=True)
 
-            # write to file
-            with open("games.json", "w") as f:
-                json.dump(data, f, indent=4)
-
-            # update vars
-            count = len(data["Games"])
-            st.session_state["gameIndex"] = count - 1
-            st.session_state["gameCount"] = count
-
-        except:
-            # bad input
-            st.info("Error with input file")
+            else:
+                if mode == "Replace all data":
+                    added = games if write({"op":"replace","games":games}) else []
+
+                else:
+                    # append games whose number is not already present
+                    added = importer.new_games(writer().read()[0]["Games"], games)
+                    if added and not write({"op":"extend","games":added}):
+                        added = []
+
+                # update vars from the data the write published
+                count = len(writer().read()[0]["Games"])
+                st.session_state["gameIndex"] = count - 1
+                st.session_state["gameCount"] = count
+
+                st.info(f"Imported {len(added)} of {len(games)} games")
+                if warnings:
+                    st.dataframe(pd.DataFrame(warnings, columns=["Row", "Warning"]), hide_index=True, use_container_width=True)
+
+# rough bytes of a frame sent to the browser
+def frame_bytes(df):
+    return int(df.memory_usage(deep=True).sum())
+
+# opt-in performance panel: latency per function and page, last rerun's calls, payload sizes, data cache use
+def debug_panel(page):
+    cache = data_cache().stats()
+    cols = st.columns(3)
+    cols[0].metric("Data Cache Hits", cache["hits"])
+    cols[1].metric("Data Cache Misses", cache["misses"])
+    cols[2].metric("Data Cache Hit Rate", f"{100 * cache['hit rate']:.1f}%")
+    run = metrics.METRICS.runs.get(page)
+    if run:
+        st.caption(f"Last {page} rerun: {run['seconds']*1000:.0f} ms")
+        st.dataframe(pd.DataFrame(run["calls"].items(), columns=["Function", "Calls"]), hide_index=True, use_container_width=True)
+    summary = metrics.METRICS.summary()
+    if summary:
+        st.dataframe(pd.DataFrame.from_dict(summary, orient="index"), use_container_width=True)
+    payloads = metrics.METRICS.payloads()
+    if payloads:
+        st.dataframe(pd.DataFrame.from_dict(payloads, orient="index"), use_container_width=True)
+    cols = st.columns(2)
+    cols[0].download_button("Prometheus", metrics.METRICS.prometheus(), file_name="tracker.prom", mime="text/plain")
+    cols[1].download_button("JSON Lines", metrics.METRICS.jsonl(), file_name="tracker.jsonl", mime="application/jsonl")
+    if st.button("Reset Metrics"):
+        metrics.METRICS.reset()
 
 # main
 st.set_page_config(page_title="7 Wonders Tracker", layout="centered")
-with st.sidebar: st.write("7 Wonders Tracker")
+with st.sidebar:
+    st.write("7 Wonders Tracker")
+    st.selectbox("Group / Season:", shards.list_shards(), key="shard")
+    st.toggle("Combine all shards", key="all_shards", help="Leaderboard and compositions over every group and season")
 
 #try:
 pg = st.navigation([st.Page(stats_page, title="Statistics"),
                     st.Page(chart_page, title="Player Charts"),
                     st.Page(comp_page, title="Compositions"),
+                    st.Page(odds_page, title="Odds"),
                     st.Page(manage_data, title="Manage Data")])
-pg.run()   
+try:
+    with metrics.METRICS.run(pg.title):
+        pg.run()
+finally:
+    # an idle session must not keep an old version of the shared data alive
+    for key in ("data", "engine"):
+        st.session_state.pop(key, None)
+
+with st.sidebar:
+    if st.toggle("Performance", key="debug", help="Timings, calls and payload sizes of recent reruns, and data cache hits"):
+        debug_panel(pg.title)
 
 #except:
     #st.info("Oh no! An error occured!")
\ No newline at end of file
@@ -0,0 +1,33 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# background threads for page aggregates, TRACKER_THREADS overrides
+THREADS = int(os.environ.get("TRACKER_THREADS", min(4, os.cpu_count() or 1)))
+
+# results kept per kind of task, older data versions are dropped first
+KEEP = 4
+
+# page aggregates computed off the script thread; a task is started once per key and every
+# session asking for it while it runs or after it finished gets the same future
+class Tasks:
+    def __init__(self, threads=THREADS, keep=KEEP):
+        self.pool = ThreadPoolExecutor(threads, thread_name_prefix="tracker-task")
+        self.keep = keep
+        self.lock = threading.Lock()
+        self.futures = {}
+
+    # future for name at key (e.g. shard and data version), started if needed; failed tasks are retried
+    def submit(self, name, key, function, *args):
+        key = json.dumps(key)
+        with self.lock:
+            futures = self.futures.setdefault(name, OrderedDict())
+            future = futures.get(key)
+            if future is None or (future.done() and future.exception() is not None):
+                future = futures[key] = self.pool.submit(function, *args)
+            futures.move_to_end(key)
+            while len(futures) > self.keep:
+                futures.popitem(last=False)
+            return future
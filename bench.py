@@ -0,0 +1,253 @@
+import argparse
+import atexit
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import analytics
+import columnar
+import model
+import simulate
+import timeline
+from datacache import DataCache
+from engine import StatsEngine, columns
+from headtohead import HeadToHead
+from model import CATEGORIES, CITIES
+from ranges import RangeIndex
+from storage import JournalStorage
+
+NAMES = ["Szymon", "Chloe", "Kevin", "Michael", "Blake", "Amanda", "Anson", "Zoey", "Collin", "Jason", "Aaron", "CJ"]
+
+# typical points per category and spread
+MEANS = {"Wonders": 8, "Gold": 5, "War": 4, "Blue": 12, "Yellow": 4, "Green": 9, "Purple": 6}
+SPREAD = {"Wonders": 3, "Gold": 2, "War": 6, "Blue": 6, "Yellow": 3, "Green": 9, "Purple": 4}
+
+# weighted sample without replacement
+def weighted_sample(rng, items, weights, k):
+    return sorted(items, key=lambda item: -rng.random() ** (1 / weights[item]))[:k]
+
+# seeded stream of games
+def iter_games(count, players=12, seed=0, table=(3, 7), cities=None, night=0.5, unknown=0.0):
+    rng = random.Random(seed)
+    pool = NAMES[:players] + [f"Player {i + 1}" for i in range(len(NAMES), players)]
+    skill = {name: rng.gauss(0, 0.15) for name in pool}
+    popularity = {name: rng.uniform(0.3, 1) for name in pool}
+    cities = cities or {city: 1 for city in CITIES}
+
+    # each city leans towards a couple of categories
+    lean = {city: {category: rng.uniform(0.7, 1.4) for category in CATEGORIES} for city in cities}
+
+    for number in range(1, count + 1):
+        size = rng.randint(table[0], min(table[1], len(pool), len(cities)))
+        names = weighted_sample(rng, pool, popularity, size)
+        seats = weighted_sample(rng, list(cities), cities, size)
+
+        players_list = []
+        for name, city in zip(names, seats):
+            if rng.random() < unknown:
+                # legacy rows: score only
+                score = max(0, round(rng.gauss(46 * (1 + skill[name]), 9)))
+                players_list.append({"Name": name, "Score": score, "City": "?",
+                                     "Breakdown": {category: 0 for category in CATEGORIES}})
+                continue
+
+            breakdown = {}
+            for category in CATEGORIES:
+                value = round(rng.gauss(MEANS[category] * lean[city][category] * (1 + skill[name]), SPREAD[category]))
+                breakdown[category] = max(-6 if category == "War" else 0, value)
+            side = "Night" if rng.random() < night else "Day"
+            players_list.append({"Name": name, "Score": sum(breakdown.values()), "City": f"{city} {side}",
+                                 "Breakdown": breakdown})
+
+        yield {"Number": number, "Players": players_list}
+
+# synthetic archive in the games.json shape
+def generate(count, **options):
+    return {"Games": list(iter_games(count, **options))}
+
+# write an archive game by game, so a million games never sit in memory
+def write_archive(path, count, **options):
+    with open(path, "w") as file:
+        file.write('{"Games": [\n')
+        for i, game in enumerate(iter_games(count, **options)):
+            if i: file.write(",\n")
+            file.write(json.dumps(game))
+        file.write("\n]}\n")
+
+# best of repeat, in seconds
+def timed(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+# the work each stats function and page does before rendering
+def cases(data):
+    stats, comps, delta_stats, delta_comps = analytics.calculate_stats(data)
+    name = next(iter(stats))
+    game = data["Games"][-1]
+    frame = columnar.to_frame(data["Games"])
+    compact = model.Games(data["Games"])
+    engine = StatsEngine(data["Games"])
+    published = StatsEngine(compact)
+    ranges = RangeIndex(columns(engine.records))
+
+    # the archive on disk, for what a data cache miss costs from a cold start
+    folder = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, folder, True)
+    store = JournalStorage(os.path.join(folder, "games.json"), os.path.join(folder, "games.journal"))
+    with open(store.snapshot, "w") as file:
+        json.dump(data, file)
+
+    def add_game():
+        engine.add(game)
+        engine.results()
+        engine.remove(len(engine.records) - 1)
+
+    # the writer's copy on write commit: fork the published version, add to the fork
+    def fork_add():
+        games = compact.copy()
+        fork = published.copy(games)
+        games.append(game)
+        fork.add(games[-1])
+        fork.results()
+
+    def chart_page():
+        stats, comps, delta_stats, delta_comps = analytics.calculate_stats(data)
+        analytics.get_history(data)
+        best = analytics.read_comps(comps[name])
+        analytics.find_synergy(comps[name][best])
+        analytics.get_distribution(name, comps)
+        analytics.get_distribution(name, delta_comps)
+
+    def comp_page():
+        frame = columnar.to_frame(data["Games"])
+        analytics.tier_table(columnar.comp_maps(frame), columnar.comp_maps(columnar.without_last(frame)))
+
+    def manage_data():
+        names = set()
+        for game in data["Games"]:
+            for player in game["Players"]:
+                names.add(player["Name"])
+        analytics.game_frame(data["Games"][-1]["Players"])
+
+    return {
+        "calculate_stats": lambda: analytics.calculate_stats(data),
+        "get_history": lambda: analytics.get_history(data),
+        "process_comps": lambda: analytics.process_comps(comps),
+        "get_distribution": lambda: [analytics.get_distribution(name, comps) for name in comps],
+        "read_comps": lambda: [analytics.read_comps(comps[name]) for name in comps],
+        "game_frame": lambda: analytics.game_frame(game["Players"]),
+        "leaderboard": lambda: analytics.leaderboard(stats),
+        "calculate_ratings": lambda: analytics.calculate_ratings(data),
+        "engine.add": add_game,
+        "engine.copy+add": fork_add,
+        "engine.series+form": lambda: timeline.form(engine.series(name), 20),
+        "HeadToHead.build": lambda: HeadToHead.build(columns(engine.records), len(engine.names)),
+        "RangeIndex": lambda: RangeIndex(columns(engine.records)),
+        "RangeIndex.results": lambda: ranges.results(engine.names, engine.games.cities.names, len(engine.records) // 4, len(engine.records) // 2),
+        "engine.as_of": lambda: engine.as_of(len(engine.records) // 2),
+        "simulate.odds": lambda: simulate.odds(simulate.score_pools(engine, [(name, "?") for name in list(stats)[:4]])[0]),
+        "columnar.to_frame": lambda: columnar.to_frame(data["Games"]),
+        "model.Games": lambda: model.Games(data["Games"]),
+        "cold:json.load": store.load,
+        "cold:DataCache.get": lambda: DataCache(store).get(),
+        "columnar.to_frame(compact)": lambda: columnar.to_frame(compact),
+        "columnar.comp_maps": lambda: columnar.comp_maps(frame),
+        "page:stats_page": lambda: (analytics.leaderboard(analytics.calculate_stats(data)[0]), analytics.game_frame(game["Players"])),
+        "page:chart_page": chart_page,
+        "page:comp_page": comp_page,
+        "page:manage_data": manage_data,
+    }
+
+# time every case at every archive size
+def run(sizes, repeat=3, **options):
+    results = {}
+    for size in sizes:
+        data = analytics.sort_players(generate(size, **options))
+        results[str(size)] = {}
+        for name, func in cases(data).items():
+            results[str(size)][name] = timed(func, repeat)
+            print(f"{size:>9} {name:<24} {results[str(size)][name] * 1000:10.2f} ms", file=sys.stderr)
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+
+    return {"meta": {"commit": commit, "python": platform.python_version(), "machine": platform.machine(),
+                     "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "repeat": repeat, "options": options},
+            "results": results}
+
+# cases that got slower than threshold between two result files
+def compare(old, new, threshold=0.2):
+    regressions = []
+    for size, cases in new["results"].items():
+        for name, seconds in cases.items():
+            before = old["results"].get(size, {}).get(name)
+            if before and seconds > before * (1 + threshold):
+                regressions.append((size, name, before, seconds))
+
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="7 Wonders Tracker benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    gen = sub.add_parser("generate", help="write a synthetic games.json")
+    gen.add_argument("games", type=int)
+    gen.add_argument("--out", default="synthetic.json")
+
+    bench = sub.add_parser("run", help="time stats functions and page data prep")
+    bench.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    bench.add_argument("--repeat", type=int, default=3)
+    bench.add_argument("--out", default="bench.json")
+
+    for command in (gen, bench):
+        command.add_argument("--players", type=int, default=12)
+        command.add_argument("--seed", type=int, default=0)
+        command.add_argument("--night", type=float, default=0.5, help="share of night-side cities")
+        command.add_argument("--unknown", type=float, default=0.0, help="share of legacy '?' rows")
+        command.add_argument("--cities", nargs="+", help="city pool, e.g. Giza=2 Rhodes")
+
+    diff = sub.add_parser("compare", help="report regressions between two result files")
+    diff.add_argument("old")
+    diff.add_argument("new")
+    diff.add_argument("--threshold", type=float, default=0.2)
+
+    args = parser.parse_args(argv)
+    if args.command == "compare":
+        with open(args.old) as file: old = json.load(file)
+        with open(args.new) as file: new = json.load(file)
+        regressions = compare(old, new, args.threshold)
+        for size, name, before, after in regressions:
+            print(f"{size:>9} {name:<24} {before * 1000:10.2f} ms -> {after * 1000:10.2f} ms")
+        return 1 if regressions else 0
+
+    cities = None
+    if args.cities:
+        cities = {}
+        for city in args.cities:
+            city, _, weight = city.partition("=")
+            cities[city] = float(weight or 1)
+    options = {"players": args.players, "seed": args.seed, "night": args.night, "unknown": args.unknown, "cities": cities}
+
+    if args.command == "generate":
+        write_archive(args.out, args.games, **options)
+    else:
+        with open(args.out, "w") as file:
+            json.dump(run(args.sizes, args.repeat, **options), file, indent=4)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
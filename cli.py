@@ -0,0 +1,187 @@
+import argparse
+import json
+import sys
+
+import analytics
+import ranges
+import shards
+import simulate
+from engine import StatsEngine
+from storage import JournalStorage
+
+# plain text table
+def format_table(rows, columns, key="Name"):
+    header = [key] + columns
+    lines = [header] + [[str(name)] + [str(row[column]) for column in columns] for name, row in rows]
+    widths = [max(len(line[i]) for line in lines) for i in range(len(header))]
+    return "\n".join("  ".join(cell.ljust(width) for cell, width in zip(line, widths)).rstrip() for line in lines)
+
+# load and sort data from the configured backend
+def load(args):
+    if args.shard not in shards.list_shards():
+        raise SystemExit(f"Unknown shard: {args.shard}")
+    if args.data:
+        store = JournalStorage(args.data, args.data.rsplit(".", 1)[0] + ".journal")
+    else:
+        store = shards.shard_storage(args.shard, args.storage)
+    return analytics.sort_players(store.load())
+
+# stats over --games, against --compare or else the same games but the last
+def range_results(args, data):
+    engine = StatsEngine(data["Games"])
+    count = len(engine.records)
+    try:
+        start, stop = ranges.parse_range(args.games, count)
+        base = ranges.parse_range(args.compare, count) if args.compare else (start, max(start, stop - 1))
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    stats, comps = engine.range_results(start, stop)
+    delta_stats, delta_comps = engine.range_results(*base)
+    return stats, comps, delta_stats, delta_comps
+
+# stats of the loaded shard, or summed over every shard
+def results(args, data):
+    if args.games:
+        if args.all_shards:
+            raise SystemExit("--games works on a single shard")
+        return range_results(args, data)
+    if args.all_shards:
+        return shards.combined_results(shards.list_shards(), args.shard)
+    return analytics.calculate_stats(data)
+
+def leaderboard(args, data):
+    stats, _, delta_stats, _ = results(args, data)
+    columns = ["Wins", "Average Points", "Average Delta", "Highscore", "Games", "Total Points"]
+
+    # a range shows its changes against --compare
+    if args.games and args.compare:
+        table = analytics.range_leaderboard(stats, delta_stats)
+        stats = table.to_dict("index")
+        columns = list(table.columns)
+
+    # ratings depend on game order, so there are none across shards or for a range
+    if not args.all_shards and not args.games:
+        ratings, _ = analytics.calculate_ratings(data)
+        stats = {name: {"Rating": ratings[name], **row} for name, row in stats.items()}
+        columns = ["Rating"] + columns
+    sort = args.sort or columns[0]
+    if sort not in columns:
+        raise SystemExit(f"Cannot sort by {sort} here")
+
+    rows = sorted(stats.items(), key=lambda item: item[1][sort], reverse=True)
+    if args.json:
+        return json.dumps(dict(rows), indent=4)
+    return format_table(rows, columns)
+
+def player(args, data):
+    stats, comps, delta_stats, delta_comps = range_results(args, data) if args.games else analytics.calculate_stats(data)
+    if args.name not in stats:
+        raise SystemExit(f"Unknown player: {args.name}")
+
+    overview = analytics.player_overview(args.name, stats, comps, delta_stats, delta_comps)
+    ratings, history = analytics.calculate_ratings(data)
+    overview["Rating"] = ratings[args.name]
+    scores, places = analytics.get_history(data)
+    overview["Scores"] = scores[args.name]
+    overview["Places"] = places[args.name]
+    overview["Ratings"] = history[args.name]
+    if args.json:
+        return json.dumps(overview, indent=4)
+
+    lines = [args.name]
+    for key, value in overview.items():
+        if key in ("Scores", "Places", "Ratings"):
+            value = " ".join(map(str, value[-args.last:]))
+        elif key == "Distribution":
+            value = ", ".join(f"{category} {percent}%" for category, (percent, _) in value.items())
+        elif isinstance(value, tuple):
+            value = value[0] if not value[1] else f"{value[0]} ({value[1]:+})"
+        lines.append(f"  {key}: {value}")
+    return "\n".join(lines)
+
+def comps(args, data):
+    _, player_comps, _, delta_comps = results(args, data)
+    if args.name:
+        if args.name not in player_comps:
+            raise SystemExit(f"Unknown player: {args.name}")
+        player_comps = {args.name: player_comps[args.name]}
+        delta_comps = {args.name: delta_comps.get(args.name, {})}
+
+    table = analytics.tier_table(analytics.process_comps(player_comps), analytics.process_comps(delta_comps))
+    rows = sorted(table.items(), key=lambda item: item[1]["Average Delta"], reverse=True)
+    if args.json:
+        return json.dumps(dict(rows), indent=4)
+    return format_table(rows, ["Tier", "Win Rate", "Average Points", "Average Delta", "Points"], key="Comp")
+
+def odds(args, data):
+    engine = StatsEngine(data["Games"])
+    lineup = [tuple(seat.split(":", 1)) if ":" in seat else (seat, "?") for seat in args.seats]
+    try:
+        pools, sources = simulate.score_pools(engine, lineup)
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    result = simulate.odds(pools, args.trials, args.budget)
+    rows = [(name, {"City": city, "Win Probability": win, "Expected Place": place, "Scores From": source})
+            for (name, city), win, place, source in zip(lineup, result["Win Probability"], result["Expected Place"], sources)]
+    if args.json:
+        return json.dumps({"Games": result["Games"], "Players": dict(rows)}, indent=4)
+    return format_table(rows, ["City", "Win Probability", "Expected Place", "Scores From"]) + f"\n{result['Games']} simulated games"
+
+# cached export files for the shard's current data version
+def export(args, data):
+    # pandas and pyarrow only load for exports
+    import exports
+
+    if args.data:
+        raise SystemExit("export works on shards, not --data")
+    store = shards.shard_storage(args.shard, args.storage)
+    engine = StatsEngine(data["Games"])
+    paths = []
+    for name in args.files or list(exports.ARTIFACTS) + ["bundle.zip"]:
+        if name not in exports.ARTIFACTS and name != "bundle.zip":
+            raise SystemExit(f"Unknown export: {name}")
+        try:
+            paths.append(exports.artifact(name, args.shard, store.version(), data, engine))
+        except ImportError:
+            print(f"Skipping {name}, pyarrow is not installed", file=sys.stderr)
+    return "\n".join(paths)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="7 Wonders Tracker statistics")
+    parser.add_argument("--storage", choices=["json", "sqlite"], help="backend, defaults to TRACKER_STORAGE or json")
+    parser.add_argument("--data", help="read this games.json (and its journal) instead")
+    parser.add_argument("--shard", default=shards.DEFAULT, help="group/season to read, e.g. Club/2025")
+    parser.add_argument("--all-shards", action="store_true", help="leaderboard and comps over every shard")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    parser.add_argument("--games", help="only games START:STOP by number, inclusive, e.g. 200:350, or --games=-50: for the last 50")
+    parser.add_argument("--compare", help="changes against games START:STOP instead of against the range without its last game")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    board = sub.add_parser("leaderboard", help="player leaderboard")
+    board.add_argument("--sort", choices=["Rating", "Wins", "Average Points", "Average Delta", "Highscore", "Games"],
+                       help="defaults to Rating, or Wins with --all-shards or --games")
+
+    one = sub.add_parser("player", help="one player's overview and history")
+    one.add_argument("name")
+    one.add_argument("--last", type=int, default=10, help="history entries to show")
+
+    comp = sub.add_parser("comps", help="composition tiers and averages")
+    comp.add_argument("--name", help="only this player's games")
+
+    chances = sub.add_parser("odds", help="simulated win probability and expected place for a lineup")
+    chances.add_argument("seats", nargs="+", help='NAME or NAME:CITY, e.g. "Anson:Giza Night"')
+    chances.add_argument("--trials", type=int, default=simulate.TRIALS, help="games to simulate")
+    chances.add_argument("--budget", type=float, default=simulate.BUDGET, help="seconds to spend at most")
+
+    files = sub.add_parser("export", help="write leaderboard, game data and flat player games exports, cached per data version")
+    files.add_argument("files", nargs="*", help="any of leaderboard.csv, games.json, games.csv, games.parquet, bundle.zip; defaults to all")
+
+    args = parser.parse_args(argv)
+    data = None if args.all_shards and args.command in ("leaderboard", "comps") else load(args)
+    print({"leaderboard": leaderboard, "player": player, "comps": comps, "odds": odds, "export": export}[args.command](args, data))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import model
+from model import CATEGORIES
+
+# flatten nested games into one row per (game, player)
+def to_frame(games):
+    if isinstance(games, model.Games):
+        return compact_frame(games)
+
+    rows = {"Game": [], "Position": [], "Name": [], "City": [], "Score": []}
+    breakdown = {category: [] for category in CATEGORIES}
+    for i, game in enumerate(games):
+        players = sorted(game["Players"], key=lambda player: player["Score"], reverse=True)
+        for pos, player in enumerate(players):
+            rows["Game"].append(i)
+            rows["Position"].append(pos)
+            rows["Name"].append(player["Name"])
+            rows["City"].append(player["City"])
+            rows["Score"].append(player["Score"])
+            values = player["Breakdown"]
+            for category in CATEGORIES:
+                breakdown[category].append(values.get(category, 0))
+
+    df = pd.DataFrame({
+        "Game": np.array(rows["Game"], dtype=np.int32),
+        "Position": np.array(rows["Position"], dtype=np.int8),
+        "Name": pd.Categorical(rows["Name"]),
+        "City": pd.Categorical(rows["City"]),
+        "Score": np.array(rows["Score"], dtype=np.int32),
+        **{category: np.array(breakdown[category], dtype=np.int16) for category in CATEGORIES}})
+
+    return add_derived(df)
+
+# same table straight from compact games' packed rows, which already keep players ordered by score
+def compact_frame(games):
+    records = games.records
+    rows = np.frombuffer(b"".join(record.rows.tobytes() for record in records), dtype=np.int32).reshape(-1, model.STRIDE)
+    sizes = np.fromiter((len(record.rows) // model.STRIDE for record in records), dtype=np.int64, count=len(records))
+    game = np.repeat(np.arange(len(records)), sizes)
+    starts = np.cumsum(sizes) - sizes
+
+    df = pd.DataFrame({
+        "Game": game.astype(np.int32),
+        "Position": (np.arange(len(rows)) - np.repeat(starts, sizes)).astype(np.int8),
+        "Name": pd.Categorical(np.array(games.players.names, dtype=object)[rows[:, 0]]),
+        "City": pd.Categorical(np.array(games.cities.names, dtype=object)[rows[:, 1]]),
+        "Score": rows[:, 2],
+        **{category: rows[:, 3 + i].astype(np.int16) for i, category in enumerate(CATEGORIES)}})
+
+    return add_derived(df)
+
+# per row delta from the game mean and win flag
+def add_derived(df):
+    grouped = df.groupby("Game", sort=False)["Score"]
+    mean = grouped.transform("mean")
+    top = grouped.transform("max")
+    df["Delta"] = df["Score"] - mean
+
+    # the replay loop also counts everyone as a winner when the top score is 0
+    df["Win"] = (df["Score"] == top) | (top == 0)
+    return df
+
+# parquet copy of the game data tagged with the storage version it was built from; the version
+# is read before the data, so a write landing meanwhile only makes the next call rebuild
+def load_frame(storage, parquet_path="games.parquet"):
+    version = json.dumps(storage.version())
+    if os.path.exists(parquet_path):
+        try:
+            df = pd.read_parquet(parquet_path)
+            if df.attrs.get("version") == version:
+                return df
+        except ImportError:
+            pass
+
+    df = to_frame(storage.load()["Games"])
+    df.attrs["version"] = version
+
+    # temp file moved into place, readers never see half a file
+    handle, temp = tempfile.mkstemp(dir=os.path.dirname(parquet_path), suffix=".tmp")
+    os.close(handle)
+    try:
+        df.to_parquet(temp, index=False)
+        os.replace(temp, parquet_path)
+    except ImportError:
+        # pyarrow missing, stay in memory only
+        pass
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+    return df
+
+# every game's player rows with the breakdown flattened, and the row where each game starts
+def game_table(games):
+    df = to_frame(games)
+    starts = np.searchsorted(df["Game"].to_numpy(), np.arange(len(games) + 1))
+    return df, starts
+
+# one game's rows in the columns the games tab and the editor show
+def game_slice(df, starts, index):
+    rows = df.iloc[starts[index]:starts[index + 1]]
+    return rows[["Name", "Score", "City", *CATEGORIES]].astype({"Name": str, "City": str}).reset_index(drop=True)
+
+# editor rows with a data_editor's changes applied: edited cells, added rows, deleted rows
+def apply_edits(rows, changes):
+    columns = list(rows[0]) if rows else []
+    rows = [dict(row) for row in rows] + [{**dict.fromkeys(columns), **row} for row in changes.get("added_rows", [])]
+    for i, values in changes.get("edited_rows", {}).items():
+        rows[int(i)].update(values)
+    deleted = set(changes.get("deleted_rows", []))
+    return [row for i, row in enumerate(rows) if i not in deleted]
+
+# indexes of games with a player or city containing text, ignoring case
+def find_games(df, text):
+    text = text.lower()
+    names = df["Name"].cat.categories.astype(str).str.lower().str.contains(text, regex=False)
+    cities = df["City"].cat.categories.astype(str).str.lower().str.contains(text, regex=False)
+    mask = np.asarray(names)[df["Name"].cat.codes] | np.asarray(cities)[df["City"].cat.codes]
+    return np.unique(df["Game"].to_numpy()[mask])
+
+# all but the last game, for delta metrics
+def without_last(df):
+    if df.empty:
+        return df
+    return df[df["Game"] < df["Game"].max()]
+
+# names or cities in order of first appearance, rows are kept in game order
+def first_seen(df, keys):
+    if isinstance(keys, str):
+        return pd.Index(df[keys].drop_duplicates())
+    return pd.MultiIndex.from_frame(df[keys].drop_duplicates())
+
+# grouped comp sums keyed by the given columns
+def comp_table(df, keys):
+    grouped = df.groupby(keys, observed=True, sort=False)
+    table = grouped[["Score", "Delta", *CATEGORIES]].sum()
+    table.insert(0, "Games", grouped.size())
+    table.insert(0, "Wins", grouped["Win"].sum())
+    return table.rename(columns={"Score": "Points", "Delta": "Total Delta"})
+
+# convert a comp table row to the dict shape used by the app
+def comp_dict(values):
+    comp = {"Wins": int(values[0]), "Games": int(values[1]), "Points": int(values[2]), "Total Delta": float(values[3])}
+    for i, category in enumerate(CATEGORIES):
+        comp[category] = int(values[4 + i])
+    return comp
+
+# consolidated comps, same shape as process_comps
+def comp_maps(df):
+    table = comp_table(df, "City").loc[first_seen(df, "City")]
+    maps = {}
+    for city, values in zip(table.index, table.itertuples(index=False)):
+        maps[city] = comp_dict(values)
+        maps[city]["Average Delta"] = round(maps[city]["Total Delta"] / maps[city]["Games"], 2)
+
+    return maps
@@ -0,0 +1,76 @@
+import gc
+import threading
+from contextlib import contextmanager
+
+from engine import StatsEngine
+from model import Games
+
+# no cyclic gc while a whole archive is parsed and interned: millions of fresh dicts and lists
+# would set off repeated full collections, and none of them form cycles
+@contextmanager
+def bulk():
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+# parsed, pre-sorted data and its stats engine, re-read only when the stored version changes;
+# games are kept as interned compact records, read like the original dicts.
+# one copy per process, shared by every session: a published version is never changed, the
+# writer applies changes to a fork and publishes that, swapped in whole
+class DataCache:
+    def __init__(self, storage):
+        self.storage = storage
+        self.key = None
+        self.current = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+
+    # cached data and engine for the current file version, no lock unless it has to be reloaded
+    def get(self):
+        key = self.storage.version()
+        # key before current, commit publishes them the other way round
+        if key == self.key:
+            current = self.current
+            self.hits += 1
+            return current
+
+        with self.lock:
+            key = self.storage.version()
+            if key == self.key:
+                self.hits += 1
+                return self.current
+
+            self.misses += 1
+            # Games orders each game's players by score as it interns them
+            with bulk():
+                data = self.storage.load()
+                data["Games"] = Games(data["Games"])
+                self.current = (data, StatsEngine(data["Games"]))
+            self.key = key
+            return self.current
+
+    # private copy of the published data and engine for the writer to change, sharing every game record
+    def fork(self):
+        data, engine = self.current
+        games = data["Games"].copy()
+        return {**data, "Games": games}, engine.copy(games)
+
+    # publish the version just written by this process, data and engine already match it
+    def commit(self, data=None, engine=None):
+        with self.lock:
+            if data is not None:
+                if not isinstance(data["Games"], Games):
+                    with bulk():
+                        data = {**data, "Games": Games(data["Games"])}
+                self.current = (data, engine if engine is not None else StatsEngine(data["Games"]))
+            self.key = self.storage.version()
+
+    # hit/miss counters
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit rate": round(self.hits / total, 3) if total else 0}
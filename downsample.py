@@ -0,0 +1,39 @@
+import os
+
+import numpy as np
+
+# most points a chart series is drawn with, TRACKER_POINTS overrides
+POINT_BUDGET = int(os.environ.get("TRACKER_POINTS", 500))
+
+# largest-triangle-three-buckets: indexes of at most budget points that keep the shape of y over x
+def lttb(x, y, budget=POINT_BUDGET):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if budget >= n or budget < 3:
+        return np.arange(n)
+
+    # bucket edges over the points between the fixed first and last one
+    edges = (np.arange(budget - 1) * (n - 2) / (budget - 2)).astype(np.int64) + 1
+    edges[-1] = n - 1
+    sizes = np.diff(edges)
+    avg_x = np.append(np.add.reduceat(x[:-1], edges[:-1]) / sizes, x[-1])
+    avg_y = np.append(np.add.reduceat(y[:-1], edges[:-1]) / sizes, y[-1])
+
+    keep = np.empty(budget, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+    a = 0
+    for i in range(budget - 2):
+        # pick the point that spans the largest triangle with the last pick and the next bucket's mean
+        start, end = edges[i], edges[i + 1]
+        area = np.abs((x[a] - avg_x[i + 1]) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y[i + 1] - y[a]))
+        a = start + int(area.argmax())
+        keep[i + 1] = a
+
+    return keep
+
+# rows to draw for several series over one x axis, the union of each series' picks
+def downsample(x, series, budget=POINT_BUDGET):
+    keep = [lttb(x, y, budget) for y in series]
+    return np.unique(np.concatenate(keep)) if keep else np.arange(len(x))
@@ -0,0 +1,471 @@
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from math import lcm
+
+from metrics import timed
+from model import CATEGORIES, STRIDE, Games
+from ratings import Ratings
+from timeline import Timeline
+
+# per game rows for a plain game dict: (name, city, score, delta, win, position, breakdown)
+def game_rows(game, pids):
+    players = [(player["Name"], player["Score"], player["City"], player["Breakdown"]) for player in game["Players"]]
+    players.sort(key=lambda player: player[1], reverse=True)
+
+    # calculate mean
+    total = 0
+    for player in players:
+        total += float(player[1])
+    mean = total / len(players) if players else 0
+
+    # same win rule as the original replay loop
+    rows = []
+    winscore = 0
+    for pos, (name, score, city, breakdown) in enumerate(players):
+        win = False
+        if not winscore or winscore == score:
+            winscore = score
+            win = True
+
+        rows.append((pids(name), city, score, float(score - mean), win, pos, breakdown))
+
+    return rows
+
+# per player rows read off a record: (pid, city, score, delta, size, win, position, breakdown values),
+# the delta kept times the table size so it stays an int
+def record_rows(record):
+    rows = record.rows
+    scores = rows[2::STRIDE]
+    size = len(scores)
+    total = sum(scores)
+
+    # records are sorted by score, so the replay loop's win rule is a tie with the top score, or
+    # everyone while that is still 0
+    top = scores[0] if size else 0
+    return [(rows[start], rows[start + 1], score, size * score - total, size, top == 0 or score == top, pos,
+             rows[start + 3:start + STRIDE])
+            for pos, (start, score) in enumerate(zip(range(0, len(rows), STRIDE), scores))]
+
+# every row of a run of records as numpy columns for the batch builds, same values as record_rows
+def columns(records):
+    import numpy as np
+
+    rows = np.frombuffer(b"".join(record.rows.tobytes() for record in records), dtype=np.int32).reshape(-1, STRIDE)
+    sizes = np.fromiter((len(record.rows) // STRIDE for record in records), dtype=np.int64, count=len(records))
+    starts = np.cumsum(sizes) - sizes
+    game = np.repeat(np.arange(len(records)), sizes)
+    score = rows[:, 2].astype(np.int64)
+    size = sizes[game]
+    total = np.bincount(game, weights=score, minlength=len(records)).astype(np.int64)[game]
+    top = score[starts[game]]
+    return {
+        "game": game, "sizes": sizes, "starts": starts,
+        "pid": rows[:, 0].astype(np.int64), "city": rows[:, 1].astype(np.int64), "score": score,
+        "delta": size * score - total, "size": size, "win": (score == top) | (top == 0),
+        "pos": np.arange(len(rows)) - starts[game], "breakdown": rows[:, 3:].astype(np.int64)}
+
+# exact total of deltas kept as {table size: sum of size * delta}, over a common denominator
+def total_delta(deltas):
+    scale = lcm(*deltas)
+    return sum(value * (scale // size) for size, value in deltas.items()) / scale
+
+# running totals for a run of games: integer sums, so taking a game back is exact
+class Aggregate:
+    def __init__(self):
+        self.players = {}
+        self.comps = {}
+
+        # ids of entries a copy has made its own, None when it owns them all
+        self.owned = None
+
+    # every game at once from columns, gids by game index
+    @classmethod
+    def build(cls, columns, gids):
+        import numpy as np
+
+        aggregate = cls()
+        if not len(columns["pid"]):
+            return aggregate
+        gid = np.frombuffer(gids, dtype=np.int64)[columns["game"]]
+        pos = columns["pos"]
+        most = int(columns["size"].max()) + 1
+
+        # sums per group of rows, and the deltas per group and table size
+        def sums(key, values):
+            groups, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+            totals = {name: np.bincount(inverse, weights=value, minlength=len(groups)).astype(np.int64).tolist()
+                      for name, value in values.items()}
+            deltas = np.bincount(inverse * most + columns["size"], weights=columns["delta"],
+                                 minlength=len(groups) * most).astype(np.int64).reshape(-1, most)
+            deltas = [{size: value for size, value in enumerate(row) if value} for row in deltas.tolist()]
+            return groups.tolist(), list(zip(gid[first].tolist(), pos[first].tolist())), totals, deltas
+
+        # player stats
+        pid = columns["pid"]
+        ones = np.ones(len(pid), dtype=np.int64)
+        groups, first, total, deltas = sums(pid, {"Wins": columns["win"], "Games": ones, "Points": columns["score"]})
+        scores = {}
+        low = int(columns["score"].min())
+        span = int(columns["score"].max()) - low + 1
+        pairs, counts = np.unique(pid * span + columns["score"] - low, return_counts=True)
+        for pair, count in zip(pairs.tolist(), counts.tolist()):
+            player, score = divmod(pair, span)
+            scores.setdefault(player, Counter())[score + low] = count
+        for i, player in enumerate(groups):
+            aggregate.players[player] = {
+                "Wins":total["Wins"][i],"Games":total["Games"][i],"Points":total["Points"][i],
+                "Delta":deltas[i],"Scores":scores[player],"First":first[i]}
+            aggregate.comps[player] = {}
+
+        # comp stats
+        cities = int(columns["city"].max()) + 1
+        breakdown = {category: columns["breakdown"][:, i] for i, category in enumerate(CATEGORIES)}
+        groups, first, total, deltas = sums(pid * cities + columns["city"],
+                                            {"Wins": columns["win"], "Games": ones, "Points": columns["score"], **breakdown})
+        for i, group in enumerate(groups):
+            player, city = divmod(group, cities)
+            aggregate.comps[player][city] = {
+                "Wins":total["Wins"][i],"Games":total["Games"][i],"Points":total["Points"][i],"Delta":deltas[i],
+                **{category: total[category][i] for category in CATEGORIES},"First":first[i]}
+
+        return aggregate
+
+    # size times delta added to an entry's deltas, sizes whose sum comes back to 0 dropped
+    @staticmethod
+    def _delta(deltas, size, delta):
+        value = deltas.get(size, 0) + delta
+        if value:
+            deltas[size] = value
+        else:
+            deltas.pop(size, None)
+
+    def add(self, gid, rows):
+        for pid, city, score, delta, size, win, pos, breakdown in rows:
+            # player stats
+            stats = self._own(self.players, pid, self._copy_entry)
+            if stats is None:
+                stats = self.players[pid] = {
+                    "Wins":0,"Games":0,"Points":0,"Delta":{},"Scores":Counter(),"First":(gid, pos)}
+
+            stats["Games"] += 1
+            stats["Points"] += score
+            stats["Scores"][score] += 1
+            if win: stats["Wins"] += 1
+            self._delta(stats["Delta"], size, delta)
+            if (gid, pos) < stats["First"]: stats["First"] = (gid, pos)
+
+            # comp stats
+            cities = self._own(self.comps, pid, dict)
+            if cities is None:
+                cities = self.comps[pid] = {}
+            comp = self._own(cities, city, self._copy_entry)
+            if comp is None:
+                comp = cities[city] = {
+                    "Wins":0,"Games":0,"Points":0,"Delta":{},"Wonders":0,"Gold":0,
+                    "War":0,"Blue":0,"Yellow":0,"Green":0,"Purple":0,"First":(gid, pos)}
+
+            comp["Games"] += 1
+            comp["Points"] += score
+            for category, value in zip(CATEGORIES, breakdown):
+                comp[category] += value
+            if win: comp["Wins"] += 1
+            self._delta(comp["Delta"], size, delta)
+            if (gid, pos) < comp["First"]: comp["First"] = (gid, pos)
+
+    # take a game back; first(pid, city) finds an entry's new first (gid, position) when it was this game
+    def remove(self, gid, rows, first):
+        for pid, city, score, delta, size, win, pos, breakdown in rows:
+            # player stats
+            stats = self._own(self.players, pid, self._copy_entry)
+            stats["Games"] -= 1
+            if not stats["Games"]:
+                del self.players[pid]
+                del self.comps[pid]
+                continue
+
+            stats["Points"] -= score
+            stats["Scores"][score] -= 1
+            if not stats["Scores"][score]: del stats["Scores"][score]
+            if win: stats["Wins"] -= 1
+            self._delta(stats["Delta"], size, -delta)
+            if stats["First"][0] == gid: stats["First"] = first(pid, None)
+
+            # comp stats
+            cities = self._own(self.comps, pid, dict)
+            comp = self._own(cities, city, self._copy_entry)
+            comp["Games"] -= 1
+            if not comp["Games"]:
+                del cities[city]
+                continue
+
+            comp["Points"] -= score
+            for category, value in zip(CATEGORIES, breakdown):
+                comp[category] -= value
+            if win: comp["Wins"] -= 1
+            self._delta(comp["Delta"], size, -delta)
+            if comp["First"][0] == gid: comp["First"] = first(pid, city)
+
+    # copy on write: entries are shared with this aggregate until the copy changes them
+    def copy(self):
+        other = Aggregate()
+        other.players = dict(self.players)
+        other.comps = dict(self.comps)
+        other.owned = set()
+        return other
+
+    # table[key] to change in place, copied first while it is still shared
+    def _own(self, table, key, copy):
+        entry = table.get(key)
+        if entry is not None and self.owned is not None and id(entry) not in self.owned:
+            entry = table[key] = copy(entry)
+            self.owned.add(id(entry))
+        return entry
+
+    @staticmethod
+    def _copy_entry(entry):
+        entry = dict(entry)
+        entry["Delta"] = dict(entry["Delta"])
+        if "Scores" in entry: entry["Scores"] = Counter(entry["Scores"])
+        return entry
+
+    # raw sums in first-appearance order, can be added to other aggregates' totals
+    def totals(self, players, cities):
+        stats = {}
+        comps = {}
+        for pid in sorted(self.players, key=lambda pid: self.players[pid]["First"]):
+            entry = self.players[pid]
+            name = players[pid]
+            stats[name] = {
+                "Wins":entry["Wins"],"Games":entry["Games"],"Total Points":float(entry["Points"]),
+                "Total Delta":total_delta(entry["Delta"]),"Highscore":max(0, max(entry["Scores"]))}
+
+            by_city = self.comps[pid]
+            comps[name] = {}
+            for city in sorted(by_city, key=lambda city: by_city[city]["First"]):
+                comp = by_city[city]
+                comps[name][cities[city]] = {
+                    "Wins":comp["Wins"],"Games":comp["Games"],"Points":comp["Points"],"Total Delta":total_delta(comp["Delta"]),
+                    **{category: comp[category] for category in CATEGORIES}}
+
+        return stats, comps
+
+    # leaderboard dicts in first-appearance order, same shape as the full replay
+    def export(self, players, cities):
+        totals, comps = self.totals(players, cities)
+        stats = {}
+        for name, total in totals.items():
+            stats[name] = {
+                "Wins":total["Wins"],
+                "Average Points":round(total["Total Points"] / total["Games"], 2),
+                "Average Delta":round(total["Total Delta"] / total["Games"], 2),
+                "Highscore":total["Highscore"],
+                "Games":total["Games"],
+                "Total Points":total["Total Points"]}
+
+        return stats, comps
+
+# persistent leaderboard aggregates, updated per game instead of replayed; the engine keeps the
+# shared game records themselves, ids are those of the games' name tables
+class StatsEngine:
+    def __init__(self, games=()):
+        # plain game lists get a container of their own for the names
+        self.games = games if isinstance(games, Games) else Games(games)
+        self.records = list(self.games.records)
+        self.gids = array("q", range(len(self.records)))
+        self.next_gid = len(self.records)
+        self.cache = None
+
+        # one pass over every row: totals, and per player series for history, form and first appearances
+        rows = columns(self.records)
+        self.full = Aggregate.build(rows, self.gids)
+        self.timeline = Timeline.build(rows, self.gids)
+
+        # ratings are built on first use, then follow appends; edits and deletes recompute them
+        self.rating = Ratings()
+        self.rating_stale = True
+
+        # head-to-head totals, built on first use, then kept up to date
+        self.h2h = None
+
+        # prefix sums for game range stats, built on first use, then extended by appends and
+        # redone from the changed game on by edits and deletes
+        self.ranges = None
+
+    # player names by id and ids by name, from the games' current name table
+    @property
+    def names(self):
+        return self.games.players.names
+
+    @property
+    def ids(self):
+        return self.games.players.ids
+
+    # independent engine for the next version of the data, over games (a copy of this engine's
+    # container by default); the one it was copied from is left as is, records and built indexes
+    # that changes drop instead of editing are shared
+    def copy(self, games=None):
+        engine = StatsEngine.__new__(StatsEngine)
+        engine.games = self.games.copy() if games is None else games
+        engine.records = list(self.records)
+        engine.gids = self.gids[:]
+        engine.next_gid = self.next_gid
+        engine.cache = self.cache
+        engine.full = self.full.copy()
+        engine.timeline = self.timeline.copy()
+
+        # readers may build ratings meanwhile, check staleness before taking them
+        engine.rating_stale = self.rating_stale
+        engine.rating = self.rating if engine.rating_stale else self.rating.copy()
+
+        engine.h2h = self.h2h.copy() if self.h2h is not None else None
+        engine.ranges = self.ranges.copy() if self.ranges is not None else None
+        return engine
+
+    # append a new game, a dict or a view of the engine's games whose record is then shared
+    def add(self, game):
+        record = self.games.record(game)
+        rows = record_rows(record)
+        gid = self.next_gid
+        self.records.append(record)
+        self.gids.append(gid)
+
+        self.full.add(gid, rows)
+        self.timeline.add(gid, rows)
+        if self.h2h is not None:
+            self.h2h.add(rows)
+        if not self.rating_stale:
+            self.rating.add(rows)
+        if self.ranges is not None:
+            self.ranges.extend(columns([record]), len(self.records) - 1)
+        self.next_gid += 1
+        self.cache = None
+
+    # replace game at index
+    def replace(self, index, game):
+        gid = self.gids[index]
+        old = record_rows(self.records[index])
+        record = self.games.record(game)
+        rows = record_rows(record)
+        self.records[index] = record
+
+        self.timeline.remove(gid, old)
+        self.full.remove(gid, old, self.first)
+        self.timeline.add(gid, rows)
+        self.full.add(gid, rows)
+        if self.h2h is not None:
+            self.h2h.remove(old)
+            self.h2h.add(rows)
+        self.rating_stale = True
+        self.redo_ranges(index)
+        self.cache = None
+
+    # delete game at index
+    def remove(self, index):
+        gid = self.gids.pop(index)
+        rows = record_rows(self.records.pop(index))
+
+        self.timeline.remove(gid, rows)
+        self.full.remove(gid, rows, self.first)
+        if self.h2h is not None:
+            self.h2h.remove(rows)
+        self.rating_stale = True
+        self.redo_ranges(index)
+        self.cache = None
+
+    # range prefix sums from game index on, after that game changed
+    def redo_ranges(self, index):
+        if self.ranges is not None:
+            self.ranges.truncate(index)
+            self.ranges.extend(columns(self.records[index:]), index)
+
+    # earliest (gid, position) left for a player or one of their comps, from the player's series
+    def first(self, pid, city=None):
+        series = self.timeline.players[pid]
+        i = 0 if city is None else series["City"].index(city)
+        gid = series["Game"][i]
+        return gid, self.records[bisect_left(self.gids, gid)].rows[0::STRIDE].index(pid)
+
+    # rename player, only the name table changes
+    def rename(self, old, new):
+        if new in self.ids and self.ids[new] in self.full.players:
+            raise ValueError(f"Player {new} already exists")
+        if old not in self.ids:
+            return
+
+        self.games.rename(old, new)
+        self.cache = None
+
+    # current rating per player, in first-appearance order
+    @timed()
+    def ratings(self):
+        if self.rating_stale:
+            self.rating = Ratings.recompute(columns(self.records))
+            self.rating_stale = False
+        players = self.full.players
+        return {self.names[pid]: round(self.rating.ratings[pid])
+                for pid in sorted(players, key=lambda pid: players[pid]["First"])}
+
+    # one player's rating after each of their games
+    def rating_history(self, name):
+        self.ratings()
+        return [round(rating) for rating in self.rating.history.get(self.ids.get(name), [])]
+
+    # one player's games in order: game number, score, place, delta and win
+    @timed()
+    def series(self, name):
+        import numpy as np
+
+        series = self.timeline.players.get(self.ids.get(name))
+        if series is None:
+            return {"Number": [], "Score": [], "Place": [], "Delta": [], "Win": []}
+
+        # gids only grow, so a game's number is its gid's rank
+        numbers = np.searchsorted(np.frombuffer(self.gids, dtype=np.int64), np.frombuffer(series["Game"], dtype=np.int64)) + 1
+        return {"Number": numbers.tolist(), "Score": series["Score"].tolist(), "Place": series["Place"].tolist(),
+                "Delta": series["Delta"].tolist(), "Win": [bool(win) for win in series["Win"]]}
+
+    # pairwise games together, times ahead and score margins, indexed by player id
+    @timed()
+    def head_to_head(self):
+        if self.h2h is None:
+            from headtohead import HeadToHead
+            self.h2h = HeadToHead.build(columns(self.records), len(self.names))
+        return self.h2h
+
+    # player_stats and player_comps over games start:stop by index
+    @timed()
+    def range_results(self, start=0, stop=None):
+        if self.ranges is None:
+            from ranges import RangeIndex
+            self.ranges = RangeIndex(columns(self.records))
+        return self.ranges.results(self.names, self.games.cities.names, start, stop)
+
+    # leaderboard as of the first count games: stats, comps and each player's rating after their last game by then
+    def as_of(self, count):
+        stats, comps = self.range_results(0, count)
+        self.ratings()
+        history = self.rating.history
+        ratings = {name: round(history[self.ids[name]][stats[name]["Games"] - 1]) for name in stats}
+        return stats, comps, ratings
+
+    # totals over every game but the last, for the delta view
+    def prefix(self):
+        prefix = self.full.copy()
+        if self.records:
+            prefix.remove(self.gids[-1], record_rows(self.records[-1]), self.first)
+        return prefix
+
+    # raw per player and per comp sums, then the same without the last game
+    def totals(self):
+        names = (self.names, self.games.cities.names)
+        return self.full.totals(*names) + self.prefix().totals(*names)
+
+    # player_stats, player_comps, delta_stats, delta_comps
+    @timed()
+    def results(self):
+        if self.cache is None:
+            names = (self.names, self.games.cities.names)
+            self.cache = self.full.export(*names) + self.prefix().export(*names)
+
+        return self.cache
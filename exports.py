@@ -0,0 +1,127 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+
+import pandas as pd
+
+import analytics
+import columnar
+import model
+
+# cached downloads: exports/<shard>/<data version>/<file>, old versions are dropped
+ROOT = "exports"
+
+# games per chunk when streaming the flat exports
+CHUNK = 5000
+
+# seconds another version's exports are left alone after their last write, so a session still
+# building or serving them never has them removed underneath it
+GRACE = 60
+
+# directory of one shard's exports for one data version
+def export_dir(shard, version, root=ROOT):
+    key = hashlib.sha1(json.dumps(version).encode()).hexdigest()[:16]
+    return os.path.join(root, *shard.split("/"), key)
+
+# write to a temporary file next to path and move it into place, so readers never see half a file
+def write_to(path, write):
+    handle, temp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(handle)
+    try:
+        write(temp)
+        os.replace(temp, path)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+# leaderboard as the stats page shows it
+def leaderboard_csv(path, data, engine):
+    stats, _, _, _ = engine.results()
+    df = analytics.leaderboard(stats, engine.ratings()) if stats else pd.DataFrame()
+    df.to_csv(path)
+
+# the whole dataset, encoded a chunk of games at a time instead of into one string
+def games_json(path, data, engine):
+    games = data["Games"]
+    rest = json.dumps({key: value for key, value in data.items() if key != "Games"})
+    with open(path, "w") as file:
+        file.write(rest[:-1] + (", " if len(rest) > 2 else "") + '"Games": [')
+        for start in range(0, len(games), CHUNK):
+            file.write((", " if start else "") + json.dumps(games[start:start + CHUNK], default=model.plain)[1:-1])
+        file.write("]}")
+
+# one row per player per game, numbered like the app, a chunk of games at a time
+def game_chunks(games):
+    for start in range(0, len(games), CHUNK):
+        df = columnar.to_frame(games[start:start + CHUNK])
+        df["Game"] += start + 1
+        yield df.astype({"Name": str, "City": str})
+
+def games_csv(path, data, engine):
+    with open(path, "w", newline="") as file:
+        for i, df in enumerate(game_chunks(data["Games"])):
+            df.to_csv(file, header=i == 0, index=False)
+
+# raises ImportError without pyarrow
+def games_parquet(path, data, engine):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for df in game_chunks(data["Games"]):
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        columnar.to_frame([]).to_parquet(path, index=False)
+
+# file name: (label, builder)
+ARTIFACTS = {
+    "leaderboard.csv": ("Download Leaderboard", leaderboard_csv),
+    "games.json": ("Download Game Data", games_json),
+    "games.csv": ("Download Player Games (CSV)", games_csv),
+    "games.parquet": ("Download Player Games (Parquet)", games_parquet)}
+
+# path of one export for the data version, built on first request
+def artifact(name, shard, version, data, engine, root=ROOT):
+    folder = export_dir(shard, version, root)
+    path = os.path.join(folder, name)
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(folder, exist_ok=True)
+    if name == "bundle.zip":
+        write_to(path, lambda temp: bundle(temp, shard, version, data, engine, root))
+    else:
+        write_to(path, lambda temp: ARTIFACTS[name][1](temp, data, engine))
+
+    # the file is in place: other versions written before this one and idle since are useless now
+    written = os.path.getmtime(folder)
+    for old in glob.glob(os.path.join(os.path.dirname(folder), "*")):
+        try:
+            changed = os.path.getmtime(old)
+        except FileNotFoundError:
+            continue
+        if old != folder and changed < written and time.time() - changed > GRACE:
+            shutil.rmtree(old, ignore_errors=True)
+    return path
+
+# every export in one zip, files are copied in from disk in blocks
+def bundle(path, shard, version, data, engine, root=ROOT):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name in ARTIFACTS:
+            try:
+                archive.write(artifact(name, shard, version, data, engine, root), name)
+            except ImportError:
+                # pyarrow missing, leave parquet out
+                pass
@@ -0,0 +1,95 @@
+import numpy as np
+
+# pairwise totals between every two players: games together, times ahead, summed score margin
+class HeadToHead:
+    def __init__(self, players=0):
+        self.games = np.zeros((players, players), dtype=np.int64)
+        self.ahead = np.zeros((players, players), dtype=np.int64)
+        self.margin = np.zeros((players, players), dtype=np.int64)
+
+    def copy(self):
+        other = HeadToHead()
+        other.games = self.games.copy()
+        other.ahead = self.ahead.copy()
+        other.margin = self.margin.copy()
+        return other
+
+    # make room for player ids below players
+    def grow(self, players):
+        size = len(self.games)
+        if players > size:
+            players = max(players, 2 * size)
+            for name in ("games", "ahead", "margin"):
+                grown = np.zeros((players, players), dtype=np.int64)
+                grown[:size, :size] = getattr(self, name)
+                setattr(self, name, grown)
+
+    # add (sign=1) or take back (sign=-1) one game's rows, as built by engine.record_rows
+    def update(self, rows, sign=1):
+        wins = sum(row[5] for row in rows)
+        pids = [row[0] for row in rows]
+        places = [1 if row[5] else row[6] - wins + 2 for row in rows]
+        self.grow(max(pids, default=-1) + 1)
+        for a in range(len(rows)):
+            for b in range(len(rows)):
+                if a != b:
+                    i, j = pids[a], pids[b]
+                    self.games[i, j] += sign
+                    self.ahead[i, j] += sign * (places[a] < places[b])
+                    self.margin[i, j] += sign * (rows[a][2] - rows[b][2])
+
+    def add(self, rows):
+        self.update(rows)
+
+    def remove(self, rows):
+        self.update(rows, -1)
+
+    # every game at once from engine.columns, pairs taken per seat
+    @classmethod
+    def build(cls, columns, players):
+        result = cls(players)
+        if not len(columns["pid"]):
+            return result
+
+        sizes = columns["sizes"]
+        starts = columns["starts"]
+        pid = columns["pid"]
+        score = columns["score"]
+        win = columns["win"]
+        wins = np.bincount(columns["game"], weights=win, minlength=len(sizes)).astype(np.int64)[columns["game"]]
+        place = np.where(win, 1, columns["pos"] - wins + 2)
+
+        # seat a against seat b in every game with enough players, a few dozen array ops in all
+        left = []
+        right = []
+        most = int(sizes.max())
+        for a in range(most):
+            for b in range(a + 1, most):
+                table = starts[sizes > b]
+                left.append(table + a)
+                right.append(table + b)
+        left = np.concatenate(left) if left else np.zeros(0, dtype=np.int64)
+        right = np.concatenate(right) if right else np.zeros(0, dtype=np.int64)
+
+        # both directions of every pair, accumulated into flat P*P cells
+        first = np.concatenate((left, right))
+        second = np.concatenate((right, left))
+        cell = pid[first] * players + pid[second]
+        size = players * players
+        result.games = np.bincount(cell, minlength=size).reshape(players, players)
+        result.ahead = np.bincount(cell, weights=place[first] < place[second], minlength=size).astype(np.int64).reshape(players, players)
+        result.margin = np.bincount(cell, weights=score[first] - score[second], minlength=size).astype(np.int64).reshape(players, players)
+        return result
+
+    # row player against column player, for the given player ids
+    def tables(self, pids):
+        index = np.ix_(pids, pids)
+        games = self.games[index]
+        ahead = self.ahead[index]
+        margin = self.margin[index]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return {
+                "Games": games,
+                "Ahead": ahead,
+                "Ahead Rate": np.where(games > 0, (100 * ahead / games).round(2), np.nan),
+                "Average Margin": np.where(games > 0, (margin / games).round(2), np.nan)}
@@ -0,0 +1,170 @@
+import codecs
+import json
+import re
+
+from model import CATEGORIES, CITIES
+
+MODES = {"?"} | {f"{city} {side}" for city in CITIES for side in ("Day", "Night")}
+
+# bad upload, carries the row-level problems
+class UploadError(ValueError):
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} error(s) in upload")
+        self.errors = errors
+
+# bytes read per chunk
+CHUNK = 1 << 16
+
+# only characters a number could still go on with, up to the end of the buffer
+NUMBER_TAIL = re.compile(r"[0-9+\-.eE]*\Z")
+
+# incremental reader over a binary file
+class Reader:
+    def __init__(self, file, chunk=CHUNK):
+        self.file = file
+        self.chunk = chunk
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    # read more text, dropping what was already consumed
+    def fill(self):
+        if self.eof:
+            return False
+        data = self.file.read(self.chunk)
+        if isinstance(data, str): data = data.encode("utf-8")
+        self.eof = not data
+        self.buffer = self.buffer[self.pos:] + self.decoder.decode(data, final=self.eof)
+        self.pos = 0
+        return True
+
+    # next non-whitespace character, not consumed
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                raise UploadError([("file", "unexpected end of file")])
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise UploadError([("file", f"expected '{char}' at offset {self.pos}")])
+        self.pos += 1
+
+    # decode one json value, reading more until it is complete
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = json.JSONDecoder().raw_decode(self.buffer, self.pos)
+                # a number running up to the buffer edge may continue in the next chunk, e.g. "-1." then "5"
+                number = isinstance(value, (int, float)) and not isinstance(value, bool)
+                if self.eof or not (number and NUMBER_TAIL.match(self.buffer, end)):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError as err:
+                if self.eof:
+                    raise UploadError([("file", f"invalid json: {err.msg} at offset {err.pos}")])
+            self.fill()
+
+# yield games from {"Games": [...]} one at a time, without loading the whole file
+def iter_games(file, chunk=CHUNK):
+    reader = Reader(file, chunk)
+    reader.expect("{")
+    found = False
+    while reader.peek() != "}":
+        key = reader.value()
+        reader.expect(":")
+        if key != "Games":
+            reader.value()
+        else:
+            found = True
+            reader.expect("[")
+            while reader.peek() != "]":
+                yield reader.value()
+                if reader.peek() == ",": reader.pos += 1
+            reader.pos += 1
+        if reader.peek() == ",": reader.pos += 1
+
+    if not found:
+        raise UploadError([("file", "missing \"Games\" list")])
+
+# errors and warnings for one game, rows are labelled "Game n, Player m"
+def validate_game(game, index):
+    errors = []
+    warnings = []
+    label = f"Game {index + 1}"
+    if not isinstance(game, dict) or "Players" not in game or not isinstance(game["Players"], list):
+        return [(label, "missing \"Players\" list")], warnings
+    if not game["Players"]:
+        errors.append((label, "no players"))
+    if "Number" in game and (not isinstance(game["Number"], int) or isinstance(game["Number"], bool)):
+        errors.append((label, "\"Number\" must be an integer"))
+
+    names = set()
+    for i, player in enumerate(game["Players"]):
+        row = f"{label}, Player {i + 1}"
+        if not isinstance(player, dict):
+            errors.append((row, "not an object"))
+            continue
+
+        missing = [key for key in ("Name", "Score", "City", "Breakdown") if key not in player]
+        if missing:
+            errors.append((row, "missing " + ", ".join(missing)))
+            continue
+
+        # name and city
+        if not isinstance(player["Name"], str) or not player["Name"]:
+            errors.append((row, "empty name"))
+        elif player["Name"] in names:
+            errors.append((row, f"{player['Name']} appears twice"))
+        else:
+            names.add(player["Name"])
+        if not isinstance(player["City"], str) or player["City"] not in MODES:
+            errors.append((row, f"unknown city {player['City']!r}"))
+
+        # score and breakdown
+        if not isinstance(player["Score"], int) or isinstance(player["Score"], bool):
+            errors.append((row, "score must be an integer"))
+            continue
+        breakdown = player["Breakdown"]
+        if not isinstance(breakdown, dict) or set(breakdown) - set(CATEGORIES):
+            errors.append((row, "breakdown keys must be " + ", ".join(CATEGORIES)))
+            continue
+        if not all(isinstance(value, int) and not isinstance(value, bool) for value in breakdown.values()):
+            errors.append((row, "breakdown values must be integers"))
+            continue
+        if sum(breakdown.values()) != player["Score"]:
+            warnings.append((row, f"breakdown sums to {sum(breakdown.values())}, score is {player['Score']}"))
+
+    return errors, warnings
+
+# stream, validate and collect every game of an uploaded file
+def read_games(file, chunk=CHUNK):
+    games = []
+    errors = []
+    warnings = []
+    for index, game in enumerate(iter_games(file, chunk)):
+        game_errors, game_warnings = validate_game(game, index)
+        errors += game_errors
+        warnings += game_warnings
+        if not game_errors: games.append(game)
+
+    if errors:
+        raise UploadError(errors)
+    return games, warnings
+
+# uploaded games whose number is not in existing, in number order
+def new_games(existing, games):
+    numbers = {game.get("Number") for game in existing}
+    fresh = []
+    for game in sorted(games, key=lambda game: (game.get("Number") is None, game.get("Number") or 0)):
+        number = game.get("Number")
+        if number is None or number not in numbers:
+            fresh.append(game)
+            numbers.add(number)
+
+    return fresh
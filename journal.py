@@ -0,0 +1,152 @@
+import json
+import os
+
+import model
+from metrics import size, timed
+
+SNAPSHOT = "games.json"
+JOURNAL = "games.journal"
+
+# journal entries between snapshots
+COMPACT_EVERY = 256
+
+# apply one journal entry to the nested data
+def apply(data, entry):
+    games = data["Games"]
+    if entry["op"] == "add":
+        games.append(entry["game"])
+
+    elif entry["op"] == "extend":
+        games.extend(entry["games"])
+
+    elif entry["op"] == "edit":
+        # a new record, copies of the data that share the old one keep it
+        games[entry["index"]] = {**games[entry["index"]], "Players": entry["players"]}
+
+    elif entry["op"] == "delete":
+        del games[entry["index"]]
+        if isinstance(games, model.Games):
+            games.renumber(entry["index"], -1)
+            return data
+        for game in games[entry["index"]:]:
+            game["Number"] -= 1
+
+    elif entry["op"] == "rename":
+        # compact games only change their name table
+        if isinstance(games, model.Games):
+            games.rename(entry["old"], entry["new"])
+            return data
+        for game in games:
+            for player in game["Players"]:
+                if player["Name"] == entry["old"]:
+                    player["Name"] = entry["new"]
+
+    # several entries committed with one write
+    elif entry["op"] == "batch":
+        for part in entry["entries"]:
+            apply(data, part)
+
+    return data
+
+# parse journal lines, skipping a torn write left by a crash
+def read_entries(path=JOURNAL):
+    entries = []
+    if not os.path.exists(path):
+        return entries
+
+    with open(path, "r") as file:
+        for line in file:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+
+    return entries
+
+# snapshot plus every journal entry written after it
+def load(snapshot=SNAPSHOT, path=JOURNAL):
+    with open(snapshot, "r") as file:
+        data = json.load(file)
+    base = data.pop("Sequence", 0)
+
+    for entry in read_entries(path):
+        if entry["seq"] > base and entry["op"] != "checkpoint":
+            apply(data, entry)
+
+    return data
+
+# first and last complete entries without reading the whole journal
+def bounds(path=JOURNAL):
+    with open(path, "rb") as file:
+        first = json.loads(file.readline())
+
+        # grow the tail window until it holds a complete line
+        size = file.seek(0, os.SEEK_END)
+        window = 4096
+        while True:
+            start = max(0, size - window)
+            file.seek(start)
+            lines = file.read().splitlines()
+            if start > 0: lines = lines[1:]
+            for line in reversed(lines):
+                try:
+                    return first, json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+            if start == 0: return first, first
+            window *= 2
+
+# durable write: temp file, fsync, atomic rename
+def write_atomic(path, text):
+    temp = path + ".tmp"
+    with open(temp, "w") as file:
+        file.write(text)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp, path)
+
+# fold everything up to seq into the snapshot and restart the journal
+@timed()
+def compact(data, seq, snapshot=SNAPSHOT, path=JOURNAL):
+    text = json.dumps({**data, "Sequence": seq}, indent=4, default=model.plain)
+    size("journal.snapshot", len(text))
+    write_atomic(snapshot, text)
+    write_atomic(path, json.dumps({"seq": seq, "op": "checkpoint"}) + "\n")
+
+# replace all data, e.g. after an upload
+def write_snapshot(data, snapshot=SNAPSHOT, path=JOURNAL):
+    if os.path.exists(path):
+        seq = bounds(path)[1]["seq"] + 1
+    else:
+        seq = 1
+    compact(data, seq, snapshot, path)
+
+# durably append one entry, data is the state after applying it
+@timed()
+def append(entry, data, snapshot=SNAPSHOT, path=JOURNAL):
+    if not os.path.exists(path):
+        # first write on a plain games.json
+        with open(snapshot, "r") as file:
+            seq = json.load(file).get("Sequence", 0)
+        write_atomic(path, json.dumps({"seq": seq, "op": "checkpoint"}) + "\n")
+
+    first, last = bounds(path)
+    entry = {"seq": last["seq"] + 1, **entry}
+
+    with open(path, "rb+") as file:
+        # terminate a torn line so the new entry stays parseable
+        end = file.seek(0, os.SEEK_END)
+        if end:
+            file.seek(end - 1)
+            if file.read(1) != b"\n": file.write(b"\n")
+        line = (json.dumps(entry) + "\n").encode("utf-8")
+        size("journal.append", len(line))
+        file.write(line)
+        file.flush()
+        os.fsync(file.fileno())
+
+    # periodic compaction
+    if entry["seq"] - first["seq"] >= COMPACT_EVERY:
+        compact(data, entry["seq"], snapshot, path)
+
+    return entry["seq"]
@@ -0,0 +1,171 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+# recent samples kept per name for percentiles
+SAMPLES = 1024
+
+# TRACKER_METRICS: Prometheus text file rewritten after every rerun, TRACKER_METRICS_LOG: JSON lines appended per rerun
+PROM_PATH = os.environ.get("TRACKER_METRICS")
+LOG_PATH = os.environ.get("TRACKER_METRICS_LOG")
+
+# latency, call count and payload size per instrumented name, shared by every session and the writer thread
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = {}
+        self.sizes = {}
+        self.runs = {}
+        self.local = threading.local()
+
+    def record(self, name, seconds):
+        with self.lock:
+            entry = self.timings.get(name)
+            if entry is None:
+                entry = self.timings[name] = {"count": 0, "total": 0.0, "samples": deque(maxlen=SAMPLES)}
+            entry["count"] += 1
+            entry["total"] += seconds
+            entry["samples"].append(seconds)
+
+        # calls made during the current rerun on this thread
+        calls = getattr(self.local, "calls", None)
+        if calls is not None:
+            calls[name] = calls.get(name, 0) + 1
+
+    def size(self, name, size):
+        with self.lock:
+            entry = self.sizes.setdefault(name, {"count": 0, "total": 0, "last": 0})
+            entry["count"] += 1
+            entry["total"] += size
+            entry["last"] = size
+
+    # time a block under name
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    # time every call of a function, under its module-qualified name by default, bare for the app script
+    def timed(self, name=None):
+        def decorate(function):
+            label = name or f"{function.__module__}.{function.__qualname__}".removeprefix("__main__.")
+
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.record(label, time.perf_counter() - start)
+            return wrapper
+        return decorate
+
+    # one page rerun: total latency under "page:<name>" and the calls it made
+    @contextmanager
+    def run(self, page):
+        self.local.calls = {}
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            calls = self.local.calls
+            self.local.calls = None
+            self.record(f"page:{page}", seconds)
+            with self.lock:
+                self.runs[page] = {"time": time.time(), "page": page, "seconds": seconds, "calls": calls}
+            if PROM_PATH or LOG_PATH:
+                self.publish(self.runs[page])
+
+    # count, mean, p50, p95 and max in milliseconds per name, slowest p95 first
+    def summary(self):
+        with self.lock:
+            timings = {name: (entry["count"], entry["total"], sorted(entry["samples"])) for name, entry in self.timings.items()}
+        rows = {}
+        for name, (count, total, samples) in timings.items():
+            rows[name] = {
+                "Calls": count,
+                "Mean ms": round(1000 * total / count, 2),
+                "p50 ms": round(1000 * quantile(samples, 0.5), 2),
+                "p95 ms": round(1000 * quantile(samples, 0.95), 2),
+                "Max ms": round(1000 * samples[-1], 2)}
+        return dict(sorted(rows.items(), key=lambda item: item[1]["p95 ms"], reverse=True))
+
+    # payload count, last and mean bytes per name
+    def payloads(self):
+        with self.lock:
+            return {name: {"Count": entry["count"], "Last bytes": entry["last"], "Mean bytes": entry["total"] // entry["count"]}
+                    for name, entry in self.sizes.items()}
+
+    # Prometheus text exposition format
+    def prometheus(self):
+        with self.lock:
+            timings = {name: (entry["count"], entry["total"], sorted(entry["samples"])) for name, entry in self.timings.items()}
+            sizes = {name: dict(entry) for name, entry in self.sizes.items()}
+
+        lines = ["# HELP tracker_seconds Latency of instrumented functions and page reruns.",
+                 "# TYPE tracker_seconds summary"]
+        for name, (count, total, samples) in sorted(timings.items()):
+            label = escape(name)
+            for q in (0.5, 0.95, 0.99):
+                lines.append(f'tracker_seconds{{name="{label}",quantile="{q}"}} {quantile(samples, q):.6f}')
+            lines.append(f'tracker_seconds_sum{{name="{label}"}} {total:.6f}')
+            lines.append(f'tracker_seconds_count{{name="{label}"}} {count}')
+
+        lines += ["# HELP tracker_payload_bytes Size of payloads written or sent to the browser.",
+                  "# TYPE tracker_payload_bytes summary"]
+        for name, entry in sorted(sizes.items()):
+            label = escape(name)
+            lines.append(f'tracker_payload_bytes_sum{{name="{label}"}} {entry["total"]}')
+            lines.append(f'tracker_payload_bytes_count{{name="{label}"}} {entry["count"]}')
+        return "\n".join(lines) + "\n"
+
+    # last rerun of every page as JSON lines
+    def jsonl(self):
+        with self.lock:
+            runs = list(self.runs.values())
+        return "".join(json.dumps(run) + "\n" for run in runs)
+
+    # push one rerun to the configured files
+    def publish(self, run):
+        try:
+            if PROM_PATH:
+                temp = f"{PROM_PATH}.{threading.get_ident()}.tmp"
+                with open(temp, "w") as file:
+                    file.write(self.prometheus())
+                os.replace(temp, PROM_PATH)
+            if LOG_PATH:
+                with self.lock, open(LOG_PATH, "a") as file:
+                    file.write(json.dumps(run) + "\n")
+        except OSError:
+            # metrics must never break a page
+            pass
+
+    def reset(self):
+        with self.lock:
+            self.timings.clear()
+            self.sizes.clear()
+            self.runs.clear()
+
+# prometheus label value
+def escape(name):
+    return name.replace("\\", "\\\\").replace('"', '\\"')
+
+# nearest-rank quantile of sorted samples
+def quantile(samples, q):
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+# process-wide registry
+METRICS = Metrics()
+timer = METRICS.timer
+timed = METRICS.timed
+size = METRICS.size
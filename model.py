@@ -0,0 +1,250 @@
+from array import array
+from collections.abc import Mapping, MutableSequence
+from operator import itemgetter
+
+CATEGORIES = ("Wonders", "Gold", "War", "Blue", "Yellow", "Green", "Purple")
+
+# wonder boards, each played Day or Night
+CITIES = ("Alexandria", "Babylon", "Ephesus", "Giza", "Halicarnassus", "Olympia", "Rhodes")
+
+INDEX = {category: i for i, category in enumerate(CATEGORIES)}
+
+# breakdown values in category order, KeyError when one is missing
+BREAKDOWN = itemgetter(*CATEGORIES)
+
+SCORE = itemgetter("Score")
+PLAYER = itemgetter("Name", "City", "Score", "Breakdown")
+
+# one player's result packed as player id, city id, score and the seven breakdown values
+STRIDE = 3 + len(CATEGORIES)
+
+# interned names: one id per distinct player or city
+class Names:
+    __slots__ = ("names", "ids")
+
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+
+    def id(self, name):
+        if name not in self.ids:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+        return self.ids[name]
+
+    def copy(self):
+        names = Names()
+        names.names = list(self.names)
+        names.ids = dict(self.ids)
+        return names
+
+# read-only breakdown values, a snapshot that later edits to the game do not change
+class Breakdown(Mapping):
+    __slots__ = ("values",)
+
+    def __init__(self, values):
+        self.values = tuple(values)
+
+    def __getitem__(self, category):
+        return self.values[INDEX[category]]
+
+    def __iter__(self):
+        return iter(CATEGORIES)
+
+    def __len__(self):
+        return len(CATEGORIES)
+
+    def items(self):
+        return zip(CATEGORIES, self.values)
+
+# one game as stored: number, optional sheet key and every result in one flat int array, players by
+# score, highest first. never changed once made and free of name tables, so versions share it freely
+class Record:
+    __slots__ = ("number", "sheet", "rows")
+
+    def __init__(self, number, sheet, rows):
+        self.number = number
+        self.sheet = sheet
+        self.rows = rows
+
+    # same results under another number
+    def renumbered(self, number):
+        return Record(number, self.sheet, self.rows)
+
+# one player's row of a game, read like the original {"Name", "Score", "City", "Breakdown"} dict
+class Result(Mapping):
+    __slots__ = ("game", "start")
+    KEYS = ("Name", "Score", "City", "Breakdown")
+
+    def __init__(self, game, start):
+        self.game = game
+        self.start = start
+
+    def __getitem__(self, key):
+        # score first, it is read the most, for sorting
+        rows = self.game.record.rows
+        start = self.start
+        if key == "Score":
+            return rows[start + 2]
+        if key == "Name":
+            return self.game.players.names[rows[start]]
+        if key == "City":
+            return self.game.cities.names[rows[start + 1]]
+        if key == "Breakdown":
+            return Breakdown(rows[start + 3:start + STRIDE])
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+# read-only view of a record under the name tables it was read with, like the original game dict
+class Game(Mapping):
+    __slots__ = ("players", "cities", "record")
+
+    def __init__(self, players, cities, record):
+        self.players = players
+        self.cities = cities
+        self.record = record
+
+    def __getitem__(self, key):
+        record = self.record
+        if key == "Players":
+            return [Result(self, start) for start in range(0, len(record.rows), STRIDE)]
+        if key == "Number" and record.number is not None:
+            return record.number
+        if key == "Sheet" and record.sheet is not None:
+            return record.sheet
+        raise KeyError(key)
+
+    def __iter__(self):
+        if self.record.number is not None: yield "Number"
+        yield "Players"
+        if self.record.sheet is not None: yield "Sheet"
+
+    def __len__(self):
+        return 1 + (self.record.number is not None) + (self.record.sheet is not None)
+
+# every game of a shard over shared player and city name tables, used as data["Games"];
+# indexing gives read-only views, changes go through Games, which replaces records instead of editing them
+class Games(MutableSequence):
+    def __init__(self, games=()):
+        self.players = Names()
+        self.cities = Names()
+        self.records = self.intern(games)
+
+    # records for many games at once: every row goes into one flat list, converted in one go and
+    # cut into one array per game, much faster than a record() call per game on a cold load
+    def intern(self, games):
+        players = self.players.ids
+        cities = self.cities.ids
+        records = []
+        cuts = []
+        flat = []
+        for game in games:
+            if not isinstance(game, dict):
+                records.append(self.record(game))
+                continue
+            start = len(flat)
+            for name, city, score, breakdown in map(PLAYER, sorted(game["Players"], key=SCORE, reverse=True)):
+                pid = players.get(name)
+                if pid is None:
+                    pid = self.players.id(name)
+                cid = cities.get(city)
+                if cid is None:
+                    cid = self.cities.id(city)
+                flat += (pid, cid, score)
+                try:
+                    flat += BREAKDOWN(breakdown)
+                except KeyError:
+                    flat += [breakdown.get(category, 0) for category in CATEGORIES]
+            cuts.append((len(records), start, len(flat), game.get("Number"), game.get("Sheet")))
+            records.append(None)
+
+        try:
+            rows = array("i", flat)
+        except TypeError:
+            # e.g. numpy or float values
+            rows = array("i", map(int, flat))
+        for i, start, stop, number, sheet in cuts:
+            records[i] = Record(number, sheet, rows[start:stop])
+        return records
+
+    # record for a game dict or view, players sorted like sort_players leaves them
+    def record(self, game):
+        if isinstance(game, Game) and game.players is self.players and game.cities is self.cities:
+            return game.record
+
+        # read everything first, the results may be views
+        players = sorted(game["Players"], key=lambda player: player["Score"], reverse=True)
+        players = [(player["Name"], player["City"], player["Score"], player["Breakdown"]) for player in players]
+        rows = array("i")
+        for name, city, score, breakdown in players:
+            rows.append(self.players.id(name))
+            rows.append(self.cities.id(city))
+            rows.append(int(score))
+            rows.extend(int(breakdown.get(category, 0)) for category in CATEGORIES)
+        return Record(game.get("Number"), game.get("Sheet"), rows)
+
+    def view(self, record):
+        return Game(self.players, self.cities, record)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.view(record) for record in self.records[index]]
+        return self.view(self.records[index])
+
+    def __iter__(self):
+        players = self.players
+        cities = self.cities
+        for record in self.records:
+            yield Game(players, cities, record)
+
+    def __setitem__(self, index, game):
+        self.records[index] = self.record(game)
+
+    def __delitem__(self, index):
+        del self.records[index]
+
+    def __len__(self):
+        return len(self.records)
+
+    def insert(self, index, game):
+        self.records.insert(index, self.record(game))
+
+    def __eq__(self, other):
+        if isinstance(other, (Games, list)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    # next version of the sequence, sharing every record and the append-only name tables
+    def copy(self):
+        games = Games.__new__(Games)
+        games.players = self.players
+        games.cities = self.cities
+        games.records = list(self.records)
+        return games
+
+    # every result with old now reads new: only the name table is swapped, records keep their ids
+    def rename(self, old, new):
+        if old not in self.players.ids:
+            return
+        players = self.players.copy()
+        pid = players.ids.pop(old)
+        players.names[pid] = new
+        players.ids[new] = pid
+        self.players = players
+
+    # shift the numbers of games from start on, as new records over the same rows
+    def renumber(self, start, shift):
+        self.records[start:] = [record.renumbered(record.number + shift) for record in self.records[start:]]
+
+# json.dumps default: compact games back to plain lists and dicts
+def plain(value):
+    if isinstance(value, Games):
+        return list(value)
+    if isinstance(value, Mapping):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,172 @@
+from array import array
+from bisect import bisect_left
+from math import lcm
+
+import numpy as np
+
+# summed per row, so any run of games is the difference of two cumulative sums
+PLAYER_SUMS = ("Wins", "Total Points", "Total Delta")
+COMP_SUMS = ("Wins", "Points", "Total Delta", "Wonders", "Gold", "War", "Blue", "Yellow", "Green", "Purple")
+
+# games start:stop by number, 1-based and inclusive, either side optional, negative counts from the end
+def parse_range(text, count):
+    first, sep, last = text.partition(":")
+    if not sep:
+        raise ValueError(f"Expected START:STOP, got {text}")
+
+    def bound(value, default, shift):
+        if not value.strip():
+            return default
+        number = int(value)
+        return max(0, min(count, count + number + shift if number < 0 else number - 1 + shift))
+
+    return bound(first, 0, 0), bound(last, count, 1)
+
+# running totals kept per player and per player comp, by the per row value they add up
+PLAYER = {"Wins": "Win", "Total Points": "Score", "Total Delta": "Delta"}
+COMP = {"Wins": "Win", "Points": "Score", "Total Delta": "Delta", **{category: category for category in COMP_SUMS[3:]}}
+
+# a comp's group key, player and city in one int
+CITY_SPAN = 1 << 20
+
+# stats for any run of games from cumulative sums kept per player and per player comp: each group
+# holds its rows' game index, seat and score in game order plus running totals with a leading zero,
+# so appends extend them and a change at index i only redoes groups' rows from game i on
+class RangeIndex:
+    def __init__(self, columns=None):
+        self.count = 0
+        self.scale = 1
+        self.players = {}
+        self.comps = {}
+
+        # groups a copy has made its own, None when it owns them all
+        self.owned = None
+        if columns is not None:
+            self.extend(columns)
+
+    # copy on write: groups are shared with this index until the copy changes them
+    def copy(self):
+        other = RangeIndex()
+        other.count = self.count
+        other.scale = self.scale
+        other.players = dict(self.players)
+        other.comps = dict(self.comps)
+        other.owned = set()
+        return other
+
+    # a group to change in place, new or copied first while it is still shared
+    def own(self, groups, key, sums):
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {"Game": array("q"), "Pos": array("q"), "Score": array("q"),
+                                   **{name: array("q", [0]) for name in sums}}
+        elif self.owned is not None and id(group) not in self.owned:
+            group = groups[key] = {field: values[:] for field, values in group.items()}
+        else:
+            return group
+        if self.owned is not None:
+            self.owned.add(id(group))
+        return group
+
+    # games appended from engine.columns, the first of them at game index first
+    def extend(self, columns, first=0):
+        self.count = first + len(columns["sizes"])
+        size = columns["size"]
+        if not len(size):
+            return
+
+        # a delta is score minus the game's mean, kept as an exact multiple of 1 / scale so
+        # differences of running totals lose nothing, however long the history
+        scale = lcm(self.scale, int(np.lcm.reduce(np.unique(size))))
+        if scale != self.scale:
+            self.rescale(scale)
+        values = {"Win": columns["win"].astype(np.int64), "Score": columns["score"],
+                  "Delta": columns["delta"] * (scale // size),
+                  **{category: columns["breakdown"][:, i] for i, category in enumerate(COMP_SUMS[3:])}}
+        rows = {"Game": columns["game"] + first, "Pos": columns["pos"], "Score": columns["score"]}
+
+        pid = columns["pid"]
+        self.append(self.players, pid, rows, values, PLAYER)
+        self.append(self.comps, pid * CITY_SPAN + columns["city"], rows, values, COMP)
+
+    # rows added to each key's group, keeping game order within it
+    def append(self, groups, keys, rows, values, sums):
+        order = np.argsort(keys, kind="stable")
+        unique, starts = np.unique(keys[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        for key, start, end in zip(unique.tolist(), starts.tolist(), ends.tolist()):
+            picked = order[start:end]
+            group = self.own(groups, key, sums)
+            for field, value in rows.items():
+                group[field].frombytes(value[picked].astype(np.int64).tobytes())
+            for name, source in sums.items():
+                total = group[name][-1] + np.cumsum(values[source][picked], dtype=np.int64)
+                group[name].frombytes(total.tobytes())
+
+    # every delta total over a new common denominator
+    def rescale(self, scale):
+        factor = scale // self.scale
+        for groups in (self.players, self.comps):
+            for key, group in groups.items():
+                total = np.frombuffer(group["Total Delta"], dtype=np.int64) * factor
+                group = self.own(groups, key, ())
+                group["Total Delta"] = array("q", total.tobytes())
+        self.scale = scale
+
+    # drop every row from game index on, to be extended again from there
+    def truncate(self, index):
+        self.count = min(self.count, index)
+        for groups in (self.players, self.comps):
+            for key in list(groups):
+                k = bisect_left(groups[key]["Game"], index)
+                if k == 0:
+                    del groups[key]
+                elif k < len(groups[key]["Game"]):
+                    group = self.own(groups, key, ())
+                    for field, values in group.items():
+                        # running totals carry a leading zero
+                        del values[k + (field not in ("Game", "Pos", "Score")):]
+
+    # groups with rows in games start:stop as (game, seat, key, first row, end row, group),
+    # ordered by the game and seat of their first row, like Aggregate's first appearance
+    @staticmethod
+    def found(groups, start, stop):
+        found = []
+        for key, group in groups.items():
+            games = group["Game"]
+            a = bisect_left(games, start)
+            b = bisect_left(games, stop, a)
+            if a < b:
+                found.append((games[a], group["Pos"][a], key, a, b, group))
+        found.sort(key=lambda item: item[:2])
+        return found
+
+    # player_stats and player_comps for games start:stop, shaped like StatsEngine.results
+    def results(self, names, cities, start=0, stop=None):
+        stop = self.count if stop is None else stop
+        player_stats = {}
+        player_comps = {}
+
+        # players, a couple of lookups each; highscore is no sum, take the max over the slice
+        for _, _, pid, a, b, group in self.found(self.players, start, stop):
+            count = b - a
+            wins, points, delta = (group[name][b] - group[name][a] for name in PLAYER_SUMS)
+            high = int(np.frombuffer(group["Score"], dtype=np.int64)[a:b].max())
+            player_stats[names[pid]] = {
+                "Wins":wins,
+                "Average Points":round(float(points) / count, 2),
+                "Average Delta":round(delta / self.scale / count, 2),
+                "Highscore":max(high, 0),
+                "Games":count,
+                "Total Points":float(points)}
+            player_comps[names[pid]] = {}
+
+        # comps per player in first-appearance order
+        for _, _, key, a, b, group in self.found(self.comps, start, stop):
+            pid, city = divmod(key, CITY_SPAN)
+            wins, points, delta, *categories = (group[name][b] - group[name][a] for name in COMP_SUMS)
+            comp = {"Wins":wins, "Games":b - a, "Points":points, "Total Delta":delta / self.scale}
+            comp.update(zip(COMP_SUMS[3:], categories))
+            player_comps[names[pid]][cities[city]] = comp
+
+        return player_stats, player_comps
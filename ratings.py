@@ -0,0 +1,90 @@
+from array import array
+
+# multiplayer elo: every game is scored as all pairwise duels between its players
+BASE = 1500
+SCALE = 400
+K = 32
+
+# pairwise points per row, winners share first place like get_history and
+# count as half a win against each other, everyone else places in score order
+def actual_scores(rows):
+    n = len(rows)
+    wins = sum(row[5] for row in rows)
+    return [n - wins + 0.5 * (wins - 1) if row[5] else n - row[6] - 1 for row in rows]
+
+# move ratings by one game's result, in place; returns the new ratings of pids
+def step(ratings, pids, actual, k=K):
+    n = len(pids)
+    if n < 2:
+        return [ratings[pid] for pid in pids]
+
+    strength = [10 ** (ratings[pid] / SCALE) for pid in pids]
+    new = []
+    for i in range(n):
+        expected = 0
+        for j in range(n):
+            if j != i: expected += strength[i] / (strength[i] + strength[j])
+        new.append(ratings[pids[i]] + k / (n - 1) * (actual[i] - expected))
+
+    # apply after computing every change, so seat order does not matter
+    for pid, rating in zip(pids, new):
+        ratings[pid] = rating
+    return new
+
+# ratings over a run of games, rows as built by engine.record_rows
+class Ratings:
+    def __init__(self):
+        self.ratings = {}
+        self.history = {}
+
+        # ids of histories a copy has made its own, None when it owns them all
+        self.owned = None
+
+    # rate one more game
+    def add(self, rows):
+        pids = [row[0] for row in rows]
+        for pid in pids:
+            self.ratings.setdefault(pid, BASE)
+        for pid, rating in zip(pids, step(self.ratings, pids, actual_scores(rows))):
+            history = self.history.setdefault(pid, array("d"))
+            if self.owned is not None and id(history) not in self.owned:
+                history = self.history[pid] = history[:]
+                self.owned.add(id(history))
+            history.append(rating)
+
+    # copy on write: histories are shared with these ratings until the copy adds to them
+    def copy(self):
+        other = Ratings()
+        other.ratings = dict(self.ratings)
+        other.history = dict(self.history)
+        other.owned = set()
+        return other
+
+    # rate every game from scratch, columns as built by engine.columns, pairwise points computed for all rows at once
+    @classmethod
+    def recompute(cls, columns):
+        import numpy as np
+
+        result = cls()
+        if not len(columns["pid"]):
+            return result
+
+        sizes = columns["sizes"][columns["sizes"] > 0]
+        starts = columns["starts"][columns["sizes"] > 0]
+        win = columns["win"]
+        n = columns["size"]
+        wins = np.repeat(np.add.reduceat(win.astype(np.int64), starts), sizes)
+        actual = np.where(win, n - wins + 0.5 * (wins - 1), n - columns["pos"] - 1).tolist()
+
+        # the rating recurrence itself is sequential in game order
+        pids = columns["pid"].tolist()
+        ratings = result.ratings
+        history = result.history
+        for pid in pids:
+            ratings.setdefault(pid, BASE)
+        for start, size in zip(starts.tolist(), sizes.tolist()):
+            game = pids[start:start + size]
+            for pid, rating in zip(game, step(ratings, game, actual[start:start + size])):
+                history.setdefault(pid, array("d")).append(rating)
+
+        return result
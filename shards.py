@@ -0,0 +1,131 @@
+import glob
+import json
+import os
+
+import journal
+from analytics import sort_players
+from engine import StatsEngine
+from storage import JournalStorage, SQLiteStorage, get_storage
+
+# one shard per group and season: shards/<group>/<season>.json, each numbered from game 1
+ROOT = "shards"
+
+# the original top-level games.json
+DEFAULT = "Main"
+
+# file path of a shard without extension
+def shard_path(name, root=ROOT):
+    if name == DEFAULT:
+        return os.path.splitext(journal.SNAPSHOT)[0]
+    group, season = name.split("/")
+    return os.path.join(root, group, season)
+
+# shard names, default first, then group/season in name order
+def list_shards(root=ROOT):
+    names = set()
+    for path in glob.glob(os.path.join(root, "*", "*")):
+        base, ext = os.path.splitext(path)
+        if ext in (".json", ".db") and not base.endswith(".summary"):
+            names.add(os.path.relpath(base, root).replace(os.sep, "/"))
+
+    return [DEFAULT] + sorted(names)
+
+# storage for one shard, same backend choice as get_storage (TRACKER_STORAGE)
+def shard_storage(name, kind=None, root=ROOT):
+    if name == DEFAULT:
+        return get_storage(kind)
+
+    base = shard_path(name, root)
+    kind = kind or os.environ.get("TRACKER_STORAGE", "json")
+    if kind == "sqlite":
+        return SQLiteStorage(base + ".db", seed=base + ".json")
+    return JournalStorage(base + ".json", base + ".journal")
+
+# new empty shard, returns its name
+def create_shard(group, season, root=ROOT):
+    group, season = group.strip(), season.strip()
+    if not group or not season or any(sep in group + season for sep in ("/", "\\")) or group.startswith("."):
+        raise ValueError("Group and season must be non-empty names without slashes")
+
+    name = f"{group}/{season}"
+    if name in list_shards(root):
+        raise ValueError(f"{name} already exists")
+
+    os.makedirs(os.path.join(root, group), exist_ok=True)
+    journal.write_atomic(shard_path(name, root) + ".json", json.dumps({"Games": []}, indent=4))
+    return name
+
+# raw per-player and per-comp sums of a stats engine
+def totals(engine):
+    players, comps, prefix_players, prefix_comps = engine.totals()
+    return {"Players": players, "Comps": comps, "Prefix Players": prefix_players, "Prefix Comps": prefix_comps}
+
+# totals of a stored shard, cached next to it until its version changes; the version is read
+# before the load, so a write landing meanwhile only makes the next call rebuild
+def summary(name, store=None, root=ROOT):
+    store = store or shard_storage(name, root=root)
+    path = shard_path(name, root) + ".summary.json"
+
+    # json turns version tuples into lists
+    version = json.loads(json.dumps(store.version()))
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as file:
+                cached = json.load(file)
+            if cached["Version"] == version:
+                return cached
+        except (json.JSONDecodeError, KeyError):
+            pass
+
+    result = {"Version": version, **totals(StatsEngine(sort_players(store.load())["Games"]))}
+    journal.write_atomic(path, json.dumps(result))
+    return result
+
+# add up totals from several shards into leaderboard stats and comps
+def combine(parts):
+    totals = {}
+    comps = {}
+    for players, player_comps in parts:
+        for name, stats in players.items():
+            total = totals.setdefault(name, {"Wins":0,"Games":0,"Total Points":0,"Total Delta":0,"Highscore":0})
+            for key in ("Wins", "Games", "Total Points", "Total Delta"):
+                total[key] += stats[key]
+            total["Highscore"] = max(total["Highscore"], stats["Highscore"])
+
+        for name, cities in player_comps.items():
+            merged = comps.setdefault(name, {})
+            for city, comp in cities.items():
+                if city not in merged:
+                    merged[city] = dict(comp)
+                else:
+                    for key in comp:
+                        merged[city][key] += comp[key]
+
+    # same shape as the engine's export
+    player_stats = {}
+    for name, total in totals.items():
+        player_stats[name] = {
+            "Wins":total["Wins"],
+            "Average Points":round(total["Total Points"] / total["Games"], 2),
+            "Average Delta":round(total["Total Delta"] / total["Games"], 2),
+            "Highscore":total["Highscore"],
+            "Games":total["Games"],
+            "Total Points":total["Total Points"]}
+
+    return player_stats, comps
+
+# player_stats, player_comps, delta_stats, delta_comps over several shards, deltas leave out
+# the last game of the active shard; engine is the active shard's published one when given
+def combined_results(names, active, engine=None, root=ROOT):
+    full = []
+    prefix = []
+    for name in names:
+        if name == active:
+            part = totals(engine) if engine is not None else summary(name, root=root)
+            prefix.append((part["Prefix Players"], part["Prefix Comps"]))
+        else:
+            part = summary(name, root=root)
+            prefix.append((part["Players"], part["Comps"]))
+        full.append((part["Players"], part["Comps"]))
+
+    return combine(full) + combine(prefix)
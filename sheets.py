@@ -0,0 +1,122 @@
+import random
+import time
+
+from model import CATEGORIES, CITIES
+
+# player rows of one game sheet
+RANGE = "A2:K8"
+
+# ranges per values().batchGet round trip
+BATCH = 100
+
+# stable id of a game sheet, survives sheet renames
+def sheet_key(spreadsheet_id, properties):
+    return f"{spreadsheet_id}:{properties.get('sheetId', properties['title'])}"
+
+# A1 range for a sheet title, quoted so spaces and quotes are safe
+def sheet_range(title):
+    return "'" + title.replace("'", "''") + "'!" + RANGE
+
+# sheet values -> player list
+def parse_rows(values):
+    players = []
+    for player in values:
+        breakdown = {
+                "Wonders": int(player[3]),
+                "Gold": int(player[4]),
+                "War": int(player[5]),
+                "Blue": int(player[6]),
+                "Yellow": int(player[7]),
+                "Green": int(player[8]),
+                "Purple": int(player[9])
+            }
+        players.append({"Name":player[0],"Score":int(player[10]),"City":player[1] + " " + player[2],"Breakdown":breakdown})
+
+    return players
+
+# games for every sheet after the first that is not in known, fetched in batches
+def fetch_games(service, spreadsheet_id, known=(), batch=BATCH):
+    spreadsheet = service.spreadsheets().get(spreadsheetId=spreadsheet_id, fields="sheets.properties(sheetId,title)").execute()
+    sheets = [sheet["properties"] for sheet in spreadsheet.get("sheets", [])][1:]
+    todo = [properties for properties in sheets if sheet_key(spreadsheet_id, properties) not in known]
+
+    games = []
+    for start in range(0, len(todo), batch):
+        part = todo[start:start + batch]
+        result = (
+            service.spreadsheets().values()
+            .batchGet(spreadsheetId=spreadsheet_id, ranges=[sheet_range(properties["title"]) for properties in part])
+            .execute()
+        )
+        for properties, values in zip(part, result.get("valueRanges", [])):
+            games.append({"Number": 0, "Players": parse_rows(values.get("values", [])),
+                          "Sheet": sheet_key(spreadsheet_id, properties)})
+
+    return games
+
+# sheet keys already imported into data
+def imported(data):
+    return {game["Sheet"] for game in data["Games"] if "Sheet" in game}
+
+# local stand-in for the Sheets v4 client, for tests and offline benchmarks
+class FakeSheets:
+    def __init__(self, workbook, latency=0.0):
+        # workbook: [(title, rows)], first sheet is the summary page
+        self.workbook = workbook
+        self.latency = latency
+        self.calls = 0
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def execute(self):
+        return self.pending
+
+    def call(self, result):
+        self.calls += 1
+        time.sleep(self.latency)
+        self.pending = result
+        return self
+
+    def get(self, spreadsheetId, fields=None):
+        return self.call({"sheets": [{"properties": {"sheetId": i, "title": title}}
+                                     for i, (title, _) in enumerate(self.workbook)]})
+
+    def batchGet(self, spreadsheetId, ranges):
+        sheets = dict(self.workbook)
+        values = []
+        for a1 in ranges:
+            title = a1.rsplit("!", 1)[0]
+            if title.startswith("'"): title = title[1:-1].replace("''", "'")
+            values.append({"range": a1, "values": sheets[title]})
+        return self.call({"valueRanges": values})
+
+# seeded workbook of n game sheets in the tracker's sheet layout
+def make_workbook(n, seed=0, names=("Szymon", "Chloe", "Kevin", "Michael", "Amanda", "Anson", "Zoey")):
+    rng = random.Random(seed)
+    workbook = [("Summary", [])]
+    for i in range(n):
+        rows = []
+        for name in rng.sample(names, rng.randint(3, min(7, len(names)))):
+            breakdown = [rng.randint(0, 15) for _ in CATEGORIES]
+            rows.append([name, rng.choice(CITIES), rng.choice(["Day", "Night"]), *map(str, breakdown), str(sum(breakdown))])
+        workbook.append((f"Game {i + 1}", rows))
+
+    return workbook
+
+if __name__ == "__main__":
+    # offline benchmark: full import, then an incremental import with one new sheet
+    workbook = make_workbook(2000)
+    service = FakeSheets(workbook, latency=0.05)
+    start = time.perf_counter()
+    games = fetch_games(service, "bench")
+    print(f"full import: {len(games)} games, {service.calls} round trips, {time.perf_counter() - start:.2f}s")
+
+    workbook.append(("Game 2001", make_workbook(1, seed=1)[1][1]))
+    service.calls = 0
+    start = time.perf_counter()
+    new = fetch_games(service, "bench", {game["Sheet"] for game in games})
+    print(f"incremental import: {len(new)} games, {service.calls} round trips, {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+# simulated games per query, seconds to spend on them at most, and games per worker task
+TRIALS = 100000
+BUDGET = 2.0
+CHUNK = 25000
+
+# worker processes, TRACKER_WORKERS overrides
+WORKERS = int(os.environ.get("TRACKER_WORKERS", os.cpu_count() or 1))
+
+# fewest games with a comp before its own scores are used instead of the player's overall ones
+MIN_GAMES = 5
+
+_pool = None
+_lock = threading.Lock()
+
+# shared worker pool, started on first use and kept for later queries; workers come from a fork
+# server (or are spawned) instead of being forked from the multithreaded server, and only need play
+def pool():
+    global _pool
+    import multiprocessing
+    with _lock:
+        if _pool is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            context = multiprocessing.get_context(method)
+            if method == "forkserver":
+                context.set_forkserver_preload(["simulate"])
+            _pool = ProcessPoolExecutor(WORKERS, mp_context=context)
+        return _pool
+
+# drop a pool whose workers died, the next query starts a new one
+def discard(executor):
+    global _pool
+    with _lock:
+        if _pool is executor:
+            _pool = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+# historical scores to draw from for each (name, city) seat, from the engine's per player series
+def score_pools(engine, lineup):
+    pools = []
+    sources = []
+    for name, city in lineup:
+        series = engine.timeline.players.get(engine.ids.get(name))
+        if series is None:
+            raise ValueError(f"No games for {name}")
+        scores = np.array(series["Score"])
+        comp = scores[np.array(series["City"]) == engine.games.cities.ids.get(city, -1)]
+        if len(comp) >= MIN_GAMES:
+            pools.append(comp)
+            sources.append(city)
+        else:
+            pools.append(scores)
+            sources.append("All Games")
+    return pools, sources
+
+# one batch of games: a random historical score per seat, winners share first like get_history
+def play(pools, trials, seed):
+    rng = np.random.default_rng(seed)
+    scores = np.column_stack([pool[rng.integers(0, len(pool), trials)] for pool in pools])
+    best = scores.max(axis=1, keepdims=True)
+    win = scores == best
+    wins = win.sum(axis=1, keepdims=True)
+    higher = (scores[:, :, None] < scores[:, None, :]).sum(axis=2)
+    place = np.where(win, 1, higher - wins + 2)
+    return win.sum(axis=0), place.sum(axis=0), trials
+
+# win probability and expected place per seat, trials spread over the worker pool until the time budget runs out
+def odds(pools, trials=TRIALS, budget=BUDGET, seed=None):
+    seeds = np.random.SeedSequence(seed).spawn(-(-trials // CHUNK))
+    # (size, seed) per batch, taken from the end
+    batches = [(min(CHUNK, trials - i * CHUNK), child) for i, child in enumerate(seeds)][::-1]
+    wins = np.zeros(len(pools))
+    places = np.zeros(len(pools))
+    done = 0
+    deadline = time.monotonic() + budget
+
+    # small queries are not worth the trip to another process
+    if len(batches) > 1 and WORKERS > 1:
+        executor = pool()
+        pending = {}
+        try:
+            while batches or pending:
+                # a couple of batches in flight per worker, more submitted as they finish
+                while batches and len(pending) < 2 * WORKERS:
+                    future = executor.submit(play, pools, *batches[-1])
+                    pending[future] = batches.pop()
+                finished, _ = wait(pending, timeout=max(0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    w, p, n = future.result()
+                    del pending[future]
+                    wins += w
+                    places += p
+                    done += n
+                if time.monotonic() > deadline:
+                    break
+        except BrokenProcessPool:
+            # a worker died, finish here
+            discard(executor)
+        for future in pending:
+            future.cancel()
+        batches.extend(pending.values())
+
+    # in process: small queries, a broken pool's leftovers, or a first batch the pool had no time for
+    while batches and (not done or time.monotonic() <= deadline):
+        w, p, n = play(pools, *batches.pop())
+        wins += w
+        places += p
+        done += n
+
+    return {
+        "Win Probability": (100 * wins / max(done, 1)).round(2).tolist(),
+        "Expected Place": (places / max(done, 1)).round(2).tolist(),
+        "Games": done}
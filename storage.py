@@ -0,0 +1,242 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import journal
+from engine import game_rows
+from model import CATEGORIES
+
+# upper bound for "games before idx" queries
+LAST = 2 ** 62
+
+# games.json snapshot plus append-only journal
+class JournalStorage:
+    indexed = False
+
+    def __init__(self, snapshot=journal.SNAPSHOT, path=journal.JOURNAL):
+        self.snapshot = snapshot
+        self.path = path
+
+    def load(self):
+        return journal.load(self.snapshot, self.path)
+
+    def append(self, entry, data):
+        return journal.append(entry, data, self.snapshot, self.path)
+
+    def write_snapshot(self, data):
+        journal.write_snapshot(data, self.snapshot, self.path)
+
+    # files whose mtime tracks the data
+    def sources(self):
+        return [file for file in (self.snapshot, self.path) if os.path.exists(file)]
+
+    # (mtime, size) of each file
+    def version(self):
+        key = []
+        for file in (self.snapshot, self.path):
+            if os.path.exists(file):
+                stat = os.stat(file)
+                key.append((stat.st_mtime_ns, stat.st_size))
+            else:
+                key.append(None)
+
+        return tuple(key)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER);
+CREATE TABLE IF NOT EXISTS games (idx INTEGER PRIMARY KEY, number INTEGER, sheet TEXT);
+CREATE TABLE IF NOT EXISTS results (
+    idx INTEGER, position INTEGER, name TEXT, city TEXT, score INTEGER,
+    wonders INTEGER, gold INTEGER, war INTEGER, blue INTEGER, yellow INTEGER, green INTEGER, purple INTEGER,
+    delta REAL, win INTEGER, place INTEGER,
+    PRIMARY KEY (idx, position));
+CREATE INDEX IF NOT EXISTS results_name ON results (name, idx, position);
+CREATE INDEX IF NOT EXISTS results_city ON results (city, idx);
+CREATE INDEX IF NOT EXISTS games_number ON games (number);
+"""
+
+# comp columns in the order the app's comp dicts use
+COMP_SQL = ("COUNT(*), SUM(win), SUM(score), SUM(delta), "
+            + ", ".join(f"SUM({category.lower()})" for category in CATEGORIES))
+
+# comp dict from a COMP_SQL row
+def comp_row(row):
+    comp = {"Wins": row[1], "Games": row[0], "Points": row[2], "Total Delta": row[3]}
+    for i, category in enumerate(CATEGORIES):
+        comp[category] = row[4 + i]
+    return comp
+
+# embedded sqlite database with one row per player result
+class SQLiteStorage:
+    indexed = True
+
+    def __init__(self, path="games.db", seed=journal.SNAPSHOT):
+        self.path = path
+        self.lock = threading.Lock()
+        with self.connect() as db:
+            db.executescript(SCHEMA)
+            if "sheet" not in [column[1] for column in db.execute("PRAGMA table_info(games)")]:
+                db.execute("ALTER TABLE games ADD COLUMN sheet TEXT")
+            db.execute("INSERT OR IGNORE INTO meta VALUES ('version', 0)")
+
+        # first run: import the existing json data
+        if not self.count() and os.path.exists(seed):
+            self.write_snapshot(JournalStorage(seed).load())
+
+    # one connection per operation, writes serialized by the lock
+    @contextmanager
+    def connect(self):
+        with self.lock:
+            db = sqlite3.connect(self.path)
+            try:
+                with db:
+                    yield db
+            finally:
+                db.close()
+
+    def count(self):
+        with self.connect() as db:
+            return db.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+
+    # insert one game at idx
+    @classmethod
+    def insert(cls, db, idx, game):
+        db.execute("INSERT INTO games VALUES (?, ?, ?)", (idx, game.get("Number", idx + 1), game.get("Sheet")))
+        cls.insert_rows(db, idx, game_rows(game, lambda name: name))
+
+    # insert a game's player results at idx
+    @staticmethod
+    def insert_rows(db, idx, rows):
+        wins = sum(row[4] for row in rows)
+        for name, city, score, delta, win, pos, breakdown in rows:
+            # same placement as get_history: winners share 1st, everyone else counts down
+            place = 1 if win else pos - wins + 2
+            db.execute("INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       (idx, pos, name, city, score, *[breakdown.get(category, 0) for category in CATEGORIES],
+                        delta, int(win), place))
+
+    @staticmethod
+    def bump(db):
+        db.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+    # nested data in the games.json shape
+    def load(self):
+        with self.connect() as db:
+            games = []
+            for number, sheet in db.execute("SELECT number, sheet FROM games ORDER BY idx"):
+                games.append({"Number": number, "Players": []} if sheet is None else {"Number": number, "Players": [], "Sheet": sheet})
+            for row in db.execute("SELECT * FROM results ORDER BY idx, position"):
+                games[row[0]]["Players"].append({
+                    "Name": row[2], "Score": row[4], "City": row[3],
+                    "Breakdown": {category: row[5 + i] for i, category in enumerate(CATEGORIES)}})
+
+        return {"Games": games}
+
+    # apply a journal entry as one transaction
+    def append(self, entry, data=None):
+        with self.connect() as db:
+            self.apply(db, entry)
+            self.bump(db)
+
+    # one journal entry against an open transaction
+    @classmethod
+    def apply(cls, db, entry):
+        if entry["op"] == "add":
+            idx = db.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+            cls.insert(db, idx, entry["game"])
+
+        elif entry["op"] == "extend":
+            idx = db.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+            for i, game in enumerate(entry["games"]):
+                cls.insert(db, idx + i, game)
+
+        elif entry["op"] == "edit":
+            db.execute("DELETE FROM results WHERE idx = ?", (entry["index"],))
+            rows = game_rows({"Players": entry["players"]}, lambda name: name)
+            cls.insert_rows(db, entry["index"], rows)
+
+        elif entry["op"] == "delete":
+            db.execute("DELETE FROM games WHERE idx = ?", (entry["index"],))
+            db.execute("DELETE FROM results WHERE idx = ?", (entry["index"],))
+            # shift through negative keys so the primary keys never collide mid-update
+            for table in ("games", "results"):
+                db.execute(f"UPDATE {table} SET idx = -idx WHERE idx > ?", (entry["index"],))
+                db.execute(f"UPDATE {table} SET idx = -idx - 1 WHERE idx < 0")
+            db.execute("UPDATE games SET number = number - 1 WHERE idx >= ?", (entry["index"],))
+
+        elif entry["op"] == "rename":
+            db.execute("UPDATE results SET name = ? WHERE name = ?", (entry["new"], entry["old"]))
+
+        elif entry["op"] == "batch":
+            for part in entry["entries"]:
+                cls.apply(db, part)
+
+    # replace all data
+    def write_snapshot(self, data):
+        with self.connect() as db:
+            db.execute("DELETE FROM games")
+            db.execute("DELETE FROM results")
+            for idx, game in enumerate(data["Games"]):
+                self.insert(db, idx, game)
+            self.bump(db)
+
+    def sources(self):
+        return [file for file in (self.path, self.path + "-wal") if os.path.exists(file)]
+
+    def version(self):
+        with self.connect() as db:
+            return db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    # player names in order of first appearance
+    def player_names(self):
+        with self.connect() as db:
+            rows = db.execute("SELECT name FROM results GROUP BY name ORDER BY MIN(idx * 1000 + position)")
+            return [row[0] for row in rows]
+
+    # leaderboard row for one player, optionally only games before idx
+    def player_stats(self, name, before=None):
+        with self.connect() as db:
+            row = db.execute("SELECT COUNT(*), SUM(win), SUM(score), SUM(delta), MAX(score) FROM results "
+                             "WHERE name = ? AND idx < ?", (name, LAST if before is None else before)).fetchone()
+
+        if not row[0]:
+            return None
+        return {"Wins": row[1], "Average Points": round(float(row[2]) / row[0], 2),
+                "Average Delta": round(row[3] / row[0], 2), "Highscore": max(row[4], 0),
+                "Games": row[0], "Total Points": float(row[2])}
+
+    # one player's comps by city, optionally only games before idx
+    def player_comps(self, name, before=None):
+        with self.connect() as db:
+            rows = db.execute(f"SELECT city, {COMP_SQL} FROM results WHERE name = ? AND idx < ? "
+                              "GROUP BY city ORDER BY MIN(idx * 1000 + position)",
+                              (name, LAST if before is None else before)).fetchall()
+
+        return {row[0]: comp_row(row[1:]) for row in rows}
+
+    # one player's scores and places in game order
+    def player_history(self, name):
+        with self.connect() as db:
+            rows = db.execute("SELECT score, place FROM results WHERE name = ? ORDER BY idx, position", (name,)).fetchall()
+
+        return [row[0] for row in rows], [row[1] for row in rows]
+
+    # consolidated comp for one city, e.g. "Alexandria Day"
+    def city_stats(self, city, before=None):
+        with self.connect() as db:
+            row = db.execute(f"SELECT {COMP_SQL} FROM results WHERE city = ? AND idx < ?",
+                             (city, LAST if before is None else before)).fetchone()
+
+        if not row[0]:
+            return None
+        comp = comp_row(row)
+        comp["Average Delta"] = round(comp["Total Delta"] / comp["Games"], 2)
+        return comp
+
+# backend picked with TRACKER_STORAGE=json|sqlite
+def get_storage(kind=None):
+    kind = kind or os.environ.get("TRACKER_STORAGE", "json")
+    if kind == "sqlite":
+        return SQLiteStorage(os.environ.get("TRACKER_DB", "games.db"))
+    return JournalStorage()
@@ -0,0 +1,235 @@
+import random
+
+import pytest
+
+import bench
+from analytics import sort_players
+from engine import StatsEngine
+from model import CATEGORIES
+
+# engine built from scratch over the same games
+def recompute(games):
+    return StatsEngine(sort_players({"Games": [dict(game) for game in games]})["Games"])
+
+# same stats, ratings, series and range results as a full recompute
+def assert_matches(engine, games):
+    fresh = recompute(games)
+    assert engine.results() == fresh.results()
+    assert engine.ratings() == fresh.ratings()
+    for name in fresh.results()[0]:
+        assert engine.series(name) == fresh.series(name)
+    count = len(games)
+    assert engine.range_results(count // 3, count) == fresh.range_results(count // 3, count)
+
+# the app's original full replay: stats and comps over every game, and as they were before the last one
+def replay(games):
+    player_stats = {}
+    player_comps = {}
+    delta_stats = {}
+    delta_comps = {}
+    for i, game in enumerate(games):
+        if i == len(games) - 1:
+            delta_stats = {name: dict(stats) for name, stats in player_stats.items()}
+            delta_comps = {name: {city: dict(comp) for city, comp in comps.items()} for name, comps in player_comps.items()}
+        mean = sum(float(player["Score"]) for player in game["Players"]) / len(game["Players"])
+
+        winscore = 0
+        for player in game["Players"]:
+            stats = player_stats.setdefault(player["Name"], {"Wins":0,"Average Points":0,"Average Delta":0,"Highscore":0,"Games":0,"Total Points":0})
+            comp = player_comps.setdefault(player["Name"], {}).setdefault(player["City"], {
+                "Wins":0,"Games":0,"Points":0,"Total Delta":0,**dict.fromkeys(CATEGORIES, 0)})
+            stats["Games"] += 1
+            stats["Total Points"] += float(player["Score"])
+            stats["Average Delta"] += float(player["Score"] - mean)
+            if player["Score"] > stats["Highscore"]: stats["Highscore"] = player["Score"]
+            comp["Points"] += player["Score"]
+            comp["Games"] += 1
+            comp["Total Delta"] += float(player["Score"] - mean)
+            for category in player["Breakdown"]:
+                comp[category] += player["Breakdown"][category]
+
+            # everyone tied with the first player wins, and everyone when the top score is 0
+            if not winscore or winscore == player["Score"]:
+                winscore = player["Score"]
+                stats["Wins"] += 1
+                comp["Wins"] += 1
+
+    for stats in (player_stats, delta_stats):
+        for player in stats.values():
+            player["Average Points"] = round(player["Total Points"] / player["Games"], 2)
+            player["Average Delta"] = round(player["Average Delta"] / player["Games"], 2)
+    return player_stats, player_comps, delta_stats, delta_comps
+
+# float sums differ from the replay's only in the last bits
+def rounded(value):
+    if isinstance(value, tuple):
+        return tuple(map(rounded, value))
+    if isinstance(value, dict):
+        return {key: rounded(item) for key, item in value.items()}
+    return round(value, 9) if isinstance(value, float) else value
+
+# same results as the original replay over the same games
+def assert_replays(engine, games):
+    assert rounded(engine.results()) == rounded(replay(games))
+
+# game with the given (name, score, city) players, best first
+def game(*players):
+    return {"Players": [{"Name": name, "Score": score, "City": city, "Breakdown": {"Wonders": score // 2, "Gold": score - score // 2}}
+                        for name, score, city in players]}
+
+@pytest.fixture
+def games():
+    return sort_players(bench.generate(300, seed=7))["Games"]
+
+def test_add_one_by_one(games):
+    engine = StatsEngine([])
+    for game in games:
+        engine.add(game)
+    assert_matches(engine, games)
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_edit_delete_add(games, seed):
+    rng = random.Random(seed)
+    engine = StatsEngine(games)
+    live = list(games)
+    for step in range(60):
+        op = rng.choice(["add", "edit", "delete"])
+        if op == "add":
+            game = dict(live[rng.randrange(len(live))])
+            live.append(game)
+            engine.add(game)
+        elif op == "edit":
+            index = rng.randrange(len(live))
+            live[index] = {"Number": live[index]["Number"], "Players": live[rng.randrange(len(live))]["Players"]}
+            engine.replace(index, live[index])
+        else:
+            index = rng.randrange(len(live))
+            del live[index]
+            engine.remove(index)
+        if step % 15 == 14:
+            assert_matches(engine, live)
+
+def test_delete_last_and_first_games(games):
+    engine = StatsEngine(games)
+    live = list(games)
+    for index in (len(live) - 1, 0, len(live) // 2):
+        del live[index]
+        engine.remove(index)
+        assert_matches(engine, live)
+
+def test_rename(games):
+    engine = StatsEngine(games)
+    old = games[0]["Players"][0]["Name"]
+    engine.rename(old, "Renamed")
+    renamed = [{**game, "Players": [{**player, "Name": "Renamed" if player["Name"] == old else player["Name"]}
+                                    for player in game["Players"]]} for game in games]
+    assert_matches(engine, renamed)
+    assert old not in engine.results()[0]
+
+def test_rename_to_existing_player(games):
+    engine = StatsEngine(games)
+    first, second = list(engine.results()[0])[:2]
+    with pytest.raises(ValueError):
+        engine.rename(first, second)
+
+def test_copy_leaves_original(games):
+    engine = StatsEngine(games)
+    before = engine.results()
+    fork = engine.copy()
+    fork.add(games[0])
+    fork.remove(0)
+    assert engine.results() == before
+    assert_matches(fork, games[1:] + [games[0]])
+
+def test_range_index_follows_changes(games):
+    rng = random.Random(4)
+    engine = StatsEngine(games)
+    live = list(games)
+    engine.range_results()
+    fork = engine.copy()
+    before = engine.range_results(0, len(live))
+    for step in range(30):
+        op = "add" if step == 3 else rng.choice(["add", "edit", "delete"])
+        index = rng.randrange(len(live))
+        if op == "add":
+            # an eight player table puts deltas over a new denominator
+            game = dict(live[index])
+            if step == 3:
+                game = {"Players": [{**player, "Name": f"New {k}"} for k, player in enumerate(live[index]["Players"] * 4)][:8]}
+            live.append(game)
+            fork.add(game)
+        elif op == "edit":
+            live[index] = {"Players": live[rng.randrange(len(live))]["Players"]}
+            fork.replace(index, live[index])
+        else:
+            del live[index]
+            fork.remove(index)
+        fresh = recompute(live)
+        for start, stop in ((0, len(live)), (index, len(live)), (0, index + 1), (len(live) // 2, len(live) // 2 + 7)):
+            assert fork.range_results(start, stop) == fresh.range_results(start, stop)
+    assert engine.range_results(0, len(games)) == before
+
+def test_tied_top_scores_all_win():
+    games = [game(("Amy", 50, "Giza Day"), ("Zed", 50, "?"), ("Kim", 49, "Rhodes Night")),
+             game(("Kim", 61, "Giza Day"), ("Amy", 40, "Giza Day"), ("Zed", 40, "?"))]
+    engine = StatsEngine(games)
+    stats, comps, _, _ = engine.results()
+    assert {name: stats[name]["Wins"] for name in stats} == {"Amy": 1, "Zed": 1, "Kim": 1}
+    assert comps["Zed"]["?"]["Wins"] == 1
+    assert_replays(engine, games)
+
+def test_zero_top_score_everyone_wins():
+    games = [game(("Amy", 30, "?"), ("Zed", 20, "?")),
+             game(("Amy", 0, "Giza Day"), ("Zed", 0, "?"), ("Kim", 0, "?"))]
+    engine = StatsEngine(games)
+    stats, _, deltas, _ = engine.results()
+    assert {name: stats[name]["Wins"] for name in stats} == {"Amy": 2, "Zed": 1, "Kim": 1}
+    assert stats["Kim"]["Highscore"] == 0
+    assert "Kim" not in deltas
+    assert_replays(engine, games)
+
+def test_unknown_cities_are_their_own_comp():
+    games = [game(("Amy", 50, "?"), ("Zed", 41, "Babylon Day")),
+             game(("Zed", 45, "?"), ("Amy", 44, "?")),
+             game(("Amy", 52, "Babylon Day"), ("Zed", 30, "?"))]
+    engine = StatsEngine(games)
+    comps = engine.results()[1]
+    assert set(comps["Amy"]) == {"?", "Babylon Day"}
+    assert comps["Amy"]["?"]["Games"] == 2 and comps["Amy"]["?"]["Points"] == 94
+    assert comps["Zed"]["?"]["Wins"] == 1
+    assert_replays(engine, games)
+
+def test_deltas_after_deleting_a_game():
+    games = [game(("Amy", 50, "?"), ("Zed", 41, "Babylon Day")),
+             game(("Zed", 45, "?"), ("Amy", 44, "?"), ("Kim", 12, "Giza Night")),
+             game(("Kim", 52, "Babylon Day"), ("Zed", 30, "?")),
+             game(("Amy", 0, "?"), ("Kim", 0, "Giza Night"))]
+    for index in (3, 1, 0):
+        engine = StatsEngine(games)
+        live = games[:index] + games[index + 1:]
+        engine.remove(index)
+        assert_replays(engine, live)
+    engine.remove(0)
+    assert_replays(engine, live[1:])
+
+def test_generated_games_match_replay(games):
+    # force ties, zero tables and unknown cities into an otherwise random history
+    rng = random.Random(5)
+    for game in rng.sample(games, 60):
+        players = game["Players"]
+        kind = rng.choice(["tie", "zero", "unknown"])
+        for k, player in enumerate(players):
+            if kind == "tie" and k < 2:
+                player["Score"] = players[0]["Score"]
+                player["Breakdown"] = dict(players[0]["Breakdown"])
+            elif kind == "zero":
+                player["Score"] = 0
+                player["Breakdown"] = dict.fromkeys(CATEGORIES, 0)
+            elif kind == "unknown":
+                player["City"] = "?"
+    engine = StatsEngine(games)
+    assert_replays(engine, games)
+    for index in (len(games) - 1, 0, len(games) // 2):
+        del games[index]
+        engine.remove(index)
+        assert_replays(engine, games)
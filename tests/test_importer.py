@@ -0,0 +1,102 @@
+import io
+import json
+
+import pytest
+
+import bench
+import importer
+from importer import UploadError
+from model import CATEGORIES
+
+# upload bytes holding the given games
+def upload(games, **extra):
+    return io.BytesIO(json.dumps({**extra, "Games": games}).encode("utf-8"))
+
+# one valid game with the given (name, score) players
+def game(*players, number=1):
+    return {"Number": number, "Players": [{"Name": name, "Score": score, "City": "?",
+                                           "Breakdown": {"Wonders": score}} for name, score in players]}
+
+@pytest.mark.parametrize("chunk", [1, 2, 3, 4, 7])
+@pytest.mark.parametrize("number", ["-1.5", "12", "1e5", "-0.25E-3", "1234567"])
+def test_numbers_split_at_a_chunk_boundary(chunk, number):
+    reader = importer.Reader(io.BytesIO(number.encode()), chunk)
+    assert reader.value() == json.loads(number)
+
+@pytest.mark.parametrize("chunk", [1, 3])
+def test_games_split_at_every_chunk_boundary(chunk):
+    text = '{"Version": -1.5, "Games": [%s], "Total": 1e5}' % json.dumps(game(("Amy", 61), ("Zed", 40)))
+    games, warnings = importer.read_games(io.BytesIO(text.encode()), chunk)
+    assert games == [game(("Amy", 61), ("Zed", 40))]
+    assert warnings == []
+
+@pytest.mark.parametrize("chunk", [1, 3])
+def test_multibyte_names_split_at_a_chunk_boundary(chunk):
+    games, _ = importer.read_games(upload([game(("Zoë", 50), ("Åsa", 40))]), chunk)
+    assert [player["Name"] for player in games[0]["Players"]] == ["Zoë", "Åsa"]
+
+# a file far bigger than a chunk never sits in the buffer whole
+def test_oversize_input_is_streamed(monkeypatch):
+    data = bench.generate(2000, seed=3)
+    file = upload(data["Games"])
+    sizes = []
+    class Watched(importer.Reader):
+        def fill(self):
+            sizes.append(len(self.buffer))
+            return super().fill()
+    monkeypatch.setattr(importer, "Reader", Watched)
+
+    assert list(importer.iter_games(file, 1 << 10)) == data["Games"]
+    assert max(sizes) < len(file.getvalue()) // 100
+
+def test_game_larger_than_a_chunk():
+    big = game(*[(f"Player {i}", i) for i in range(200)])
+    games, _ = importer.read_games(upload([big]), 16)
+    assert games == [big]
+
+@pytest.mark.parametrize("text, message", [
+    (b"", "unexpected end of file"),
+    (b"[]", "expected '{'"),
+    (b'{"Other": []}', "missing \"Games\" list"),
+    (b'{"Games": [{"Players": [}]}', "invalid json"),
+    (b'{"Games": [{"Players": []}', "unexpected end of file"),
+])
+def test_malformed_files(text, message):
+    with pytest.raises(UploadError) as err:
+        importer.read_games(io.BytesIO(text), 3)
+    assert message in err.value.errors[0][1]
+
+def test_malformed_games():
+    good = game(("Amy", 10))
+    bad = [
+        {"Number": 2},
+        {"Number": "3", "Players": []},
+        game(("Amy", 10), ("Amy", 12)),
+        {"Players": [{"Name": ["Amy"], "Score": 1, "City": "Rome", "Breakdown": {"Wonders": 1}}]},
+        {"Players": [{"Name": "Amy", "Score": 1.5, "City": "?", "Breakdown": {"Wonders": 1}}]},
+        {"Players": [{"Name": "Amy", "Score": 1, "City": "?", "Breakdown": {"Coins": 1}}]},
+        {"Players": [{"Name": "Amy", "City": "?"}]},
+        {"Players": ["Amy"]},
+    ]
+    with pytest.raises(UploadError) as err:
+        importer.read_games(upload([good, *bad]), 5)
+
+    assert err.value.errors == [
+        ("Game 2", "missing \"Players\" list"),
+        ("Game 3", "no players"),
+        ("Game 3", "\"Number\" must be an integer"),
+        ("Game 4, Player 2", "Amy appears twice"),
+        ("Game 5, Player 1", "empty name"),
+        ("Game 5, Player 1", "unknown city 'Rome'"),
+        ("Game 6, Player 1", "score must be an integer"),
+        ("Game 7, Player 1", "breakdown keys must be " + ", ".join(CATEGORIES)),
+        ("Game 8, Player 1", "missing Score, Breakdown"),
+        ("Game 9, Player 1", "not an object"),
+    ]
+
+def test_breakdown_mismatch_is_a_warning():
+    mismatch = game(("Amy", 10))
+    mismatch["Players"][0]["Breakdown"] = {"Wonders": 4}
+    games, warnings = importer.read_games(upload([mismatch]))
+    assert games == [mismatch]
+    assert warnings == [("Game 1, Player 1", "breakdown sums to 4, score is 10")]
@@ -0,0 +1,90 @@
+import copy
+import json
+import random
+
+import pytest
+
+import bench
+import journal
+import model
+from analytics import sort_players
+
+# random add, extend, edit, delete, rename and batch entries over games
+def entries(games, count, seed):
+    rng = random.Random(seed)
+    names = sorted({player["Name"] for game in games for player in game["Players"]})
+    for i in range(count):
+        op = rng.choice(["add", "extend", "edit", "delete", "rename", "batch"])
+        if op == "add":
+            yield {"op": "add", "game": {**copy.deepcopy(rng.choice(games)), "Number": len(games) + 1}}
+        elif op == "extend":
+            yield {"op": "extend", "games": [{**copy.deepcopy(rng.choice(games)), "Number": len(games) + 1 + k} for k in range(3)]}
+        elif op == "edit":
+            yield {"op": "edit", "index": rng.randrange(len(games)), "players": copy.deepcopy(rng.choice(games)["Players"])}
+        elif op == "delete":
+            yield {"op": "delete", "index": rng.randrange(len(games))}
+        elif op == "rename":
+            old = rng.choice(names)
+            names[names.index(old)] = f"{old} {i}"
+            yield {"op": "rename", "old": old, "new": f"{old} {i}"}
+        else:
+            yield {"op": "batch", "entries": [{"op": "add", "game": {**copy.deepcopy(rng.choice(games)), "Number": len(games) + 1}},
+                                              {"op": "delete", "index": 0}]}
+
+# plain nested data as json would store it
+def plain(data):
+    return json.loads(json.dumps(data, default=model.plain))
+
+@pytest.fixture
+def files(tmp_path):
+    snapshot = tmp_path / "games.json"
+    path = tmp_path / "games.journal"
+    # players ordered by score, as the writer stores them
+    data = sort_players(bench.generate(40, seed=3))
+    snapshot.write_text(json.dumps(data))
+    return data, str(snapshot), str(path)
+
+@pytest.mark.parametrize("compact_every", [1000, 16])
+def test_replay_matches_memory(files, monkeypatch, compact_every):
+    monkeypatch.setattr(journal, "COMPACT_EVERY", compact_every)
+    data, snapshot, path = files
+    for entry in list(entries(data["Games"], 60, seed=compact_every)):
+        journal.apply(data, copy.deepcopy(entry))
+        journal.append(entry, data, snapshot, path)
+        assert journal.load(snapshot, path) == plain(data)
+
+def test_compact_games_match_plain_replay(files):
+    data, snapshot, path = files
+    compact = {"Games": model.Games(copy.deepcopy(data["Games"]))}
+    for entry in entries(data["Games"], 60, seed=5):
+        journal.apply(data, copy.deepcopy(entry))
+        journal.apply(compact, copy.deepcopy(entry))
+    assert plain(compact) == plain(data)
+
+def test_torn_write_is_skipped(files):
+    data, snapshot, path = files
+    entry = {"op": "delete", "index": 0}
+    journal.apply(data, dict(entry))
+    journal.append(entry, data, snapshot, path)
+    expected = plain(data)
+
+    # a crash mid-append leaves half a line
+    with open(path, "a") as file:
+        file.write('{"seq": 99, "op": "add", "ga')
+    assert journal.load(snapshot, path) == expected
+
+    # the next append still lands on its own line
+    entry = {"op": "rename", "old": data["Games"][0]["Players"][0]["Name"], "new": "New"}
+    journal.apply(data, dict(entry))
+    journal.append(entry, data, snapshot, path)
+    assert journal.load(snapshot, path) == plain(data)
+
+def test_write_snapshot_supersedes_journal(files):
+    data, snapshot, path = files
+    entry = {"op": "delete", "index": 0}
+    journal.apply(data, dict(entry))
+    journal.append(entry, data, snapshot, path)
+
+    replaced = bench.generate(5, seed=9)
+    journal.write_snapshot(replaced, snapshot, path)
+    assert journal.load(snapshot, path) == replaced
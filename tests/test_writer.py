@@ -0,0 +1,108 @@
+import json
+import threading
+
+import pytest
+
+import bench
+import importer
+from analytics import sort_players
+from datacache import DataCache
+from engine import StatsEngine
+from model import CATEGORIES
+from storage import JournalStorage, SQLiteStorage
+from writer import Conflict, Request, Writer
+
+# game with the given (name, score) players, all cities unknown
+def game(*players):
+    return {"Number": 0, "Players": [{"Name": name, "Score": score, "City": "?", "Breakdown": dict.fromkeys(CATEGORIES, 0)}
+                                     for name, score in players]}
+
+@pytest.fixture(params=["json", "sqlite"])
+def store(request, tmp_path):
+    snapshot = tmp_path / "games.json"
+    snapshot.write_text(json.dumps(bench.generate(30, seed=1)))
+    if request.param == "json":
+        return JournalStorage(str(snapshot), str(tmp_path / "games.journal"))
+    return SQLiteStorage(str(tmp_path / "games.db"), str(snapshot))
+
+@pytest.fixture
+def writer(store):
+    return Writer(store, DataCache(store))
+
+# published data matches storage and a freshly built engine
+def assert_durable(writer, store):
+    data, engine, _ = writer.read()
+    disk = sort_players(store.load())
+    assert disk == data
+    assert StatsEngine(disk["Games"]).results() == engine.results()
+
+def test_concurrent_adds_are_numbered_in_order(writer, store):
+    base = writer.read()[2]
+    threads = [threading.Thread(target=writer.submit, args=({"op": "add", "game": game(("Zed", 40), ("Amy", 60))}, base))
+               for _ in range(20)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert [game["Number"] for game in writer.read()[0]["Games"]] == list(range(1, 51))
+    assert_durable(writer, store)
+
+def test_stale_edit_of_the_same_game_conflicts(writer, store):
+    base = writer.read()[2]
+    writer.submit({"op": "edit", "index": 3, "players": game(("Amy", 60))["Players"]}, base)
+    with pytest.raises(Conflict):
+        writer.submit({"op": "edit", "index": 3, "players": game(("Zed", 40))["Players"]}, base)
+
+    # other games are still fine to change from the same base
+    writer.submit({"op": "edit", "index": 4, "players": game(("Zed", 40))["Players"]}, base)
+    assert_durable(writer, store)
+
+def test_stale_edit_after_delete_conflicts(writer, store):
+    base = writer.read()[2]
+    writer.submit({"op": "delete", "index": 5}, base)
+    with pytest.raises(Conflict):
+        writer.submit({"op": "edit", "index": 10, "players": game(("Amy", 60))["Players"]}, base)
+    assert_durable(writer, store)
+
+def test_replace_conflicts_with_older_bases(writer, store):
+    base = writer.read()[2]
+    writer.submit({"op": "replace", "games": store.load()["Games"][:5]})
+    with pytest.raises(Conflict):
+        writer.submit({"op": "delete", "index": 1}, base)
+    assert len(writer.read()[0]["Games"]) == 5
+    assert_durable(writer, store)
+
+def test_rename_onto_existing_player_is_rejected(writer, store):
+    names = list(writer.read()[1].results()[0])
+    with pytest.raises(ValueError):
+        writer.submit({"op": "rename", "old": names[0], "new": names[1]})
+    writer.submit({"op": "rename", "old": names[0], "new": "Renamed"})
+    assert "Renamed" in writer.read()[1].results()[0]
+    assert_durable(writer, store)
+
+def test_invalid_entries_are_rejected_before_queueing(writer):
+    writes = writer.writes
+    for entry in ({"op": "add", "game": game(("Amy", "sixty"))},
+                  {"op": "extend", "games": [game(("Amy", 60)), game(("Amy", 60), ("Amy", 50))]},
+                  {"op": "replace", "games": [game(("Amy", 60)), {"Number": 2, "Players": "Amy"}]},
+                  {"op": "edit", "index": 0, "players": [{"Name": ["Amy"], "Score": 60, "City": {}, "Breakdown": {}}]}):
+        with pytest.raises(importer.UploadError) as error:
+            writer.submit(entry)
+        assert error.value.errors
+    assert writer.writes == writes
+
+def test_failing_request_leaves_the_rest_of_its_batch(writer, store, monkeypatch):
+    add = StatsEngine.add
+    def failing(self, game):
+        if game["Players"][0]["Name"] == "Bad":
+            raise RuntimeError("boom")
+        return add(self, game)
+    monkeypatch.setattr(StatsEngine, "add", failing)
+
+    count = len(writer.read()[0]["Games"])
+    requests = [Request({"op": "add", "game": game((name, 50))}, None) for name in ("Amy", "Bad", "Zed")]
+    writer.commit(requests)
+    monkeypatch.undo()
+
+    assert isinstance(requests[1].error, RuntimeError)
+    assert [request.result["game"]["Number"] for request in (requests[0], requests[2])] == [count + 1, count + 2]
+    assert [game["Players"][0]["Name"] for game in writer.read()[0]["Games"][count:]] == ["Amy", "Zed"]
+    assert_durable(writer, store)
@@ -0,0 +1,114 @@
+import bisect
+from array import array
+
+# one player's games as parallel arrays in game order, with the city played for first-appearance lookups
+FIELDS = ("Game", "Score", "Place", "Delta", "Win", "City")
+TYPES = {"Game": "q", "Score": "i", "Place": "i", "Delta": "d", "Win": "b", "City": "i"}
+
+# per player series of game id, score, place, delta, win and city, kept up to date as games change
+class Timeline:
+    def __init__(self):
+        self.players = {}
+
+        # ids of series a copy has made its own, None when it owns them all
+        self.owned = None
+
+    # every game at once from engine.columns, gids by game index
+    @classmethod
+    def build(cls, columns, gids):
+        import numpy as np
+
+        timeline = cls()
+        pid = columns["pid"]
+        if not len(pid):
+            return timeline
+
+        # same placement as get_history: winners share 1st, everyone else counts down
+        wins = np.bincount(columns["game"], weights=columns["win"], minlength=len(columns["sizes"])).astype(np.int64)[columns["game"]]
+        values = {
+            "Game": np.frombuffer(gids, dtype=np.int64)[columns["game"]],
+            "Score": columns["score"],
+            "Place": np.where(columns["win"], 1, columns["pos"] - wins + 2),
+            "Delta": columns["delta"] / columns["size"],
+            "Win": columns["win"],
+            "City": columns["city"]}
+        dtypes = {field: np.dtype(code) for field, code in TYPES.items()}
+
+        # rows grouped by player, still in game order
+        order = np.argsort(pid, kind="stable")
+        players, starts = np.unique(pid[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        values = {field: value[order].astype(dtypes[field]) for field, value in values.items()}
+        for player, start, end in zip(players.tolist(), starts.tolist(), ends.tolist()):
+            timeline.players[player] = {field: array(TYPES[field], value[start:end].tobytes()) for field, value in values.items()}
+        return timeline
+
+    def add(self, gid, rows):
+        wins = sum(row[5] for row in rows)
+        for pid, city, score, delta, size, win, pos, breakdown in rows:
+            if pid not in self.players:
+                self.players[pid] = {field: array(TYPES[field]) for field in FIELDS}
+            series = self.own(pid)
+            i = bisect.bisect(series["Game"], gid)
+            for field, value in zip(FIELDS, (gid, score, 1 if win else pos - wins + 2, delta / size, win, city)):
+                series[field].insert(i, value)
+
+    # copy on write: series are shared with this timeline until the copy changes them
+    def copy(self):
+        other = Timeline()
+        other.players = dict(self.players)
+        other.owned = set()
+        return other
+
+    # a player's series to change in place, copied first while it is still shared
+    def own(self, pid):
+        series = self.players[pid]
+        if self.owned is not None and id(series) not in self.owned:
+            series = self.players[pid] = {field: values[:] for field, values in series.items()}
+            self.owned.add(id(series))
+        return series
+
+    def remove(self, gid, rows):
+        for row in rows:
+            series = self.own(row[0])
+            i = bisect.bisect_left(series["Game"], gid)
+            for field in FIELDS:
+                del series[field][i]
+            if not series["Game"]:
+                del self.players[row[0]]
+
+# mean of the last window values at every point, shorter at the start
+def rolling_mean(values, window):
+    import numpy as np
+
+    values = np.asarray(values, dtype=float)
+    total = np.concatenate(([0.0], np.cumsum(values)))
+    end = np.arange(1, len(values) + 1)
+    start = np.maximum(end - window, 0)
+    return (total[end] - total[start]) / (end - start)
+
+# length of the run of true flags ending at every point
+def run_lengths(flags):
+    import numpy as np
+
+    flags = np.asarray(flags, dtype=bool)
+    index = np.arange(len(flags))
+    last_break = np.maximum.accumulate(np.where(flags, -1, index)) if len(flags) else index
+    return np.where(flags, index - last_break, 0)
+
+# rolling form over a series: average score, win rate and average delta of the last window games, and streaks
+def form(series, window):
+    import numpy as np
+
+    wins = np.asarray(series["Win"], dtype=bool)
+    win_streak = run_lengths(wins)
+    loss_streak = run_lengths(~wins)
+    return {
+        "Game": np.asarray(series["Number"]),
+        "Average Points": rolling_mean(series["Score"], window).round(2),
+        "Win Rate": (100 * rolling_mean(wins, window)).round(2),
+        "Average Delta": rolling_mean(series["Delta"], window).round(2),
+        "Win Streak": win_streak,
+        "Loss Streak": loss_streak,
+        "Longest Win Streak": int(win_streak.max(initial=0)),
+        "Longest Loss Streak": int(loss_streak.max(initial=0))}
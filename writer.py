@@ -0,0 +1,282 @@
+import queue
+import threading
+import time
+import uuid
+
+import importer
+import journal
+from analytics import sort_players
+from metrics import timed
+
+# extra wait for more submissions before writing a batch, in seconds; submissions
+# that queue up while the previous batch is being written are batched anyway
+WINDOW = 0.0
+
+# most entries per durable write
+MAX_BATCH = 256
+
+# applied entries kept for version checks
+HISTORY = 1024
+
+# a submission that no longer fits the data it was based on
+class Conflict(ValueError):
+    pass
+
+# pending submission, the submitting session waits on done
+class Request:
+    def __init__(self, entry, base):
+        self.entry = entry
+        self.base = base
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+# games an entry would write, row by row checks raise UploadError before anything is queued
+def validate(entry):
+    if entry["op"] == "add":
+        games = [entry["game"]]
+    elif entry["op"] in ("extend", "replace"):
+        games = entry["games"]
+    elif entry["op"] == "edit":
+        games = [{"Players": entry["players"]}]
+    else:
+        return
+    errors = [error for i, game in enumerate(games) for error in importer.validate_game(game, i)[0]]
+    if errors:
+        raise importer.UploadError(errors)
+
+# does entry, based on an older version, clash with an entry applied since?
+def conflicts(entry, applied):
+    if applied["op"] == "replace" or entry["op"] == "replace":
+        return True
+    # appends never move existing games
+    if entry["op"] in ("add", "extend") or applied["op"] in ("add", "extend"):
+        return False
+    # an edit elsewhere leaves indexes alone
+    if applied["op"] == "edit" and entry["op"] in ("edit", "delete"):
+        return applied["index"] == entry["index"]
+    return True
+
+# the one thread that mutates a shard: serializes submissions, checks versions and batches writes
+class Writer:
+    def __init__(self, storage, cache, window=WINDOW, max_batch=MAX_BATCH):
+        self.storage = storage
+        self.cache = cache
+        self.window = window
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+
+        # version counts applied entries, history holds (version, entry) back to floor
+        self.version = 0
+        self.floor = 0
+        self.history = []
+        self.loads = None
+        self.writes = 0
+
+        # (data, engine, version) handed to readers, replaced whole on every commit
+        self.published = None
+
+        # versions count from 0 in every process, epoch tells this one's apart on disk
+        self.epoch = uuid.uuid4().hex
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    # data, engine and the version they show, the same objects for every reader until the next commit
+    def read(self):
+        data, engine = self.cache.get()
+        published = self.published
+        if published is not None and published[0] is data:
+            return published
+
+        # reloaded from disk since
+        with self.cache.lock:
+            data, engine = self.cache.get()
+            self.sync()
+            self.published = (data, engine, self.version)
+            return self.published
+
+    # data was reloaded from disk by someone else, older versions can't be checked any more
+    def sync(self):
+        if self.cache.misses != self.loads:
+            if self.loads is not None:
+                self.version += 1
+                self.floor = self.version
+                self.history = []
+            self.loads = self.cache.misses
+
+    # queue an entry and wait for it to be durable; returns what was applied or raises
+    def submit(self, entry, base=None, timeout=30):
+        validate(entry)
+        request = Request(entry, base)
+        self.queue.put(request)
+        if not request.done.wait(timeout):
+            raise TimeoutError("write was not committed in time")
+        if request.error:
+            raise request.error
+        return request.result
+
+    def run(self):
+        while True:
+            requests = [self.queue.get()]
+
+            # gather submissions that arrive close together
+            deadline = time.perf_counter() + self.window
+            while len(requests) < self.max_batch:
+                try:
+                    requests.append(self.queue.get(timeout=max(0, deadline - time.perf_counter())))
+                except queue.Empty:
+                    break
+
+            try:
+                self.commit(requests)
+            except Exception as err:
+                # memory may be ahead of disk, reload on next read
+                self.cache.key = None
+                for request in requests:
+                    if not request.done.is_set():
+                        request.error = err
+                        request.done.set()
+
+    # apply a batch to a fork of the published data, write it with one append, then publish the fork
+    def commit(self, requests):
+        with self.cache.lock:
+            self.cache.get()
+            self.sync()
+
+            data = engine = None
+            pending = []
+            for request in requests:
+                if request.entry["op"] == "replace":
+                    # full rewrite, flush what came before it first
+                    self.flush(pending, data, engine)
+                    pending = []
+                    data = engine = None
+                    self.replace(request)
+                    continue
+
+                # copy on write, readers keep the published version meanwhile
+                if data is None:
+                    data, engine = self.cache.fork()
+                    state = (self.version, self.floor, list(self.history))
+                try:
+                    request.result = self.apply(data, engine, request)
+                    pending.append(request)
+                except Exception as err:
+                    request.error = err
+                    request.done.set()
+                    # only this request fails; the fork may hold part of it, so redo the rest on a new one
+                    self.version, self.floor, self.history = state
+                    data, engine = self.cache.fork()
+                    state = (self.version, self.floor, list(self.history))
+                    for applied in pending:
+                        applied.result = self.apply(data, engine, applied)
+
+            self.flush(pending, data, engine)
+
+    @timed()
+    def flush(self, pending, data, engine):
+        if not pending:
+            return
+        entries = [request.result for request in pending]
+        self.storage.append(entries[0] if len(entries) == 1 else {"op":"batch","entries":entries}, data)
+        self.cache.commit(data, engine)
+        self.published = (data, engine, self.version)
+        self.loads = self.cache.misses
+        self.writes += 1
+        for request in pending:
+            request.done.set()
+
+    # check one entry against newer versions and apply it to data and engine
+    def apply(self, data, engine, request):
+        entry = dict(request.entry)
+        if request.base is not None and request.base < self.version:
+            if request.base < self.floor and entry["op"] not in ("add", "extend"):
+                raise Conflict("Data changed since it was loaded, reload and try again")
+            for version, applied in self.history:
+                if version > request.base and conflicts(entry, applied):
+                    raise Conflict("Data changed since it was loaded, reload and try again")
+
+        games = data["Games"]
+        if entry["op"] in ("edit", "delete") and not 0 <= entry["index"] < len(games):
+            raise Conflict(f"Game {entry['index'] + 1} no longer exists")
+
+        if entry["op"] == "add":
+            # numbered here, so concurrent submissions never share a number
+            entry["game"] = sort_players({"Games": [dict(entry["game"])]})["Games"][0]
+            if not entry["game"].get("Number"): entry["game"]["Number"] = len(games) + 1
+            journal.apply(data, entry)
+            engine.add(games[-1])
+
+        elif entry["op"] == "extend":
+            entry["games"] = sort_players({"Games": [dict(game) for game in entry["games"]]})["Games"]
+            for i, game in enumerate(entry["games"]):
+                if not game.get("Number"): game["Number"] = len(games) + i + 1
+            journal.apply(data, entry)
+            for game in games[len(games) - len(entry["games"]):]:
+                engine.add(game)
+
+        elif entry["op"] == "edit":
+            entry["players"] = sort_players({"Games": [{"Players": entry["players"]}]})["Games"][0]["Players"]
+            journal.apply(data, entry)
+            engine.replace(entry["index"], games[entry["index"]])
+
+        elif entry["op"] == "delete":
+            journal.apply(data, entry)
+            engine.remove(entry["index"])
+
+        elif entry["op"] == "rename":
+            engine.rename(entry["old"], entry["new"])
+            journal.apply(data, entry)
+
+        self.version += 1
+        self.history.append((self.version, entry))
+        if len(self.history) > HISTORY:
+            self.floor = self.history.pop(0)[0]
+        return entry
+
+    # replace all data, e.g. after a full upload
+    def replace(self, request):
+        data = sort_players({"Games": request.entry["games"]})
+        self.storage.write_snapshot(data)
+        self.cache.commit(data)
+        self.loads = self.cache.misses
+        self.writes += 1
+
+        self.version += 1
+        self.floor = self.version
+        self.history = []
+        self.published = (*self.cache.current, self.version)
+        request.result = {"op":"replace","games":data["Games"]}
+        request.done.set()
+
+if __name__ == "__main__":
+    # concurrent submit benchmark against a scratch journal
+    import json
+    import os
+    import tempfile
+
+    from datacache import DataCache
+    from storage import JournalStorage
+
+    for window, max_batch in ((0.0, 1), (0.0, MAX_BATCH), (0.002, MAX_BATCH)):
+        for users in (1, 4, 16):
+            folder = tempfile.mkdtemp()
+            store = JournalStorage(os.path.join(folder, "games.json"), os.path.join(folder, "games.journal"))
+            with open(store.snapshot, "w") as file:
+                json.dump({"Games": []}, file)
+            writer = Writer(store, DataCache(store), window, max_batch)
+
+            def submit():
+                for _ in range(50):
+                    writer.submit({"op":"add","game":{"Players":[{"Name":"A","Score":50,"City":"?","Breakdown":{}}]}})
+
+            threads = [threading.Thread(target=submit) for _ in range(users)]
+            start = time.perf_counter()
+            for thread in threads: thread.start()
+            for thread in threads: thread.join()
+            elapsed = time.perf_counter() - start
+
+            numbers = [game["Number"] for game in store.load()["Games"]]
+            assert numbers == list(range(1, users * 50 + 1))
+            print(f"window {window * 1000:.0f}ms, batch {max_batch:>3}, {users:>2} users: {len(numbers) / elapsed:8.0f} games/s, {writer.writes} writes")